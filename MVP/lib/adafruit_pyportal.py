@@ -46,6 +46,7 @@ Implementation Notes
 import os
 import time
 import gc
+import json
 import board
 import busio
 from digitalio import DigitalInOut
@@ -62,6 +63,17 @@ import supervisor
 from adafruit_bitmap_font import bitmap_font
 from adafruit_io.adafruit_io import IO_HTTP, AdafruitIO_RequestError
 import adafruit_sdcard
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+from perf_stats import PERF
+from fast_boot import BootTimeline
+from mem_stats import MEM
+from image_cache import ImageCache, cache_key
+import qr_render
+import text_layout
+from recovery import Recovery
 
 
 
@@ -96,11 +108,23 @@ TIME_SERVICE = "https://io.adafruit.com/api/v2/%s/integrations/time/strftime?x-a
 # See https://apidock.com/ruby/DateTime/strftime for full options
 TIME_SERVICE_STRFTIME = '&fmt=%25Y-%25m-%25d+%25H%3A%25M%3A%25S.%25L+%25j+%25u+%25z+%25Z'
 LOCALFILE = "local.txt"
+# feed key lookups are remembered here when there's an SD card
+IO_FEEDS_FILE = "/sd/io_feeds.json"
+STATE_FILE = "/sd/state.json"
+IO_RETRIES = 4
+# boot screens are faded in over BOOT_FADE seconds and shown for at least BOOT_HOLD
+BOOT_SCREENS = ("/thankyou.bmp", "/pyportal_startup.bmp")
+BOOT_FADE = 0.5
+BOOT_HOLD = 2
+# room reserved in a text label when text_maxlen doesn't bound it
+TEXT_MAX_GLYPHS = 64
+REPLAYFILE = "replay.json"
 # pylint: enable=line-too-long
 
 
 class Fake_Requests:
-    """For faking 'requests' using a local file instead of the network."""
+    """For faking 'requests' using a local file instead of the network.
+    See ``replay_requests`` for per-URL recordings with streaming and timing."""
     def __init__(self, filename):
         self._filename = filename
         with open(filename, "r") as file:
@@ -133,6 +157,9 @@ class PyPortal:
                        there's multiple texts. Defaults to ``None``.
     :param text_wrap: Whether or not to wrap text (for long text data chunks). Defaults to
                       ``False``, no wrapping.
+    :param text_wrap_width: The width in pixels to wrap text to, measured with the glyph widths
+                            of ``text_font``. Takes the place of ``text_wrap`` when set. Can be a
+                            list for when there's multiple texts. Defaults to 0, not used.
     :param text_maxlen: The max length of the text for text wrapping. Defaults to 0.
     :param text_transform: A function that will be called on the text before display
     :param image_json_path: The JSON traversal path for a background image to display. Defaults to
@@ -154,6 +181,16 @@ class PyPortal:
     :param esp: A passed ESP32 object, Can be used in cases where the ESP32 chip needs to be used
                              before calling the pyportal class. Defaults to ``None``.
     :param busio.SPI external_spi: A previously declared spi object. Defaults to ``None``.
+    :param image_cache_quota: Bytes of converted images to keep on the SD card, so unchanged
+                              images aren't downloaded again. ``0`` disables the cache.
+                              Defaults to 1MB.
+    :param fast_boot: Skip the boot screens and their fades. Defaults to ``False``, in which
+                      case they play while the ESP32 and WiFi come up.
+    :param replay_speed: Speed factor used when answering requests from a ``replay.json``
+                         recording instead of the network. Defaults to ``1``, the recorded timing.
+    :param state_snapshot: A function returning a dict of application state. If given, it is
+                           saved to ``/sd/state.json`` before restarting on ``MemoryError``, and
+                           the state saved last time is in ``restored_state``. Defaults to ``None``.
     :param debug: Turn on debug print outs. Defaults to False.
 
     """
@@ -161,13 +198,16 @@ class PyPortal:
     def __init__(self, *, url=None, headers=None, json_path=None, regexp_path=None,
                  default_bg=0x000000, status_neopixel=None,
                  text_font=None, text_position=None, text_color=0x808080,
-                 text_wrap=False, text_maxlen=0, text_transform=None,
+                 text_wrap=False, text_wrap_width=0, text_maxlen=0, text_transform=None,
                  image_json_path=None, image_resize=None, image_position=None,
                  caption_text=None, caption_font=None, caption_position=None,
                  caption_color=0x808080, image_url_path=None,
-                 success_callback=None, esp=None, external_spi=None, debug=False):
+                 success_callback=None, esp=None, external_spi=None,
+                 image_cache_quota=1024*1024, fast_boot=False, replay_speed=1,
+                 state_snapshot=None, debug=False):
 
         self._debug = debug
+        self.boot_timeline = BootTimeline()
 
         try:
             if hasattr(board, 'TFT_BACKLIGHT'):
@@ -191,6 +231,10 @@ class PyPortal:
         self._regexp_path = regexp_path
         self._success_callback = success_callback
 
+        self._state_snapshot = state_snapshot
+        self._recovery = None
+        self.restored_state = {}
+
         if status_neopixel:
             self.neopix = neopixel.NeoPixel(status_neopixel, 1, brightness=0.2)
         else:
@@ -203,6 +247,19 @@ class PyPortal:
         except OSError:
             self._uselocal = False
 
+        self._requests = requests
+        self._io = None
+        self._io_feeds = {}
+        self.time_rtt = 0
+        self._replaying = False
+        try:
+            os.stat(REPLAYFILE)
+            from replay_requests import ReplayRequests
+            self._requests = ReplayRequests.from_manifest(REPLAYFILE, speed=replay_speed)
+            self._replaying = True
+        except OSError:
+            pass
+
         if self._debug:
             print("Init display")
         self.splash = displayio.Group(max_size=15)
@@ -211,25 +268,20 @@ class PyPortal:
             print("Init background")
         self._bg_group = displayio.Group(max_size=1)
         self._bg_file = None
+        self._bg_sprite = None
+        self._bg_current = None
+        self._bg_position = None
+        self._bg_color_sprite = None
+        self._bg_palette = None
         self._default_bg = default_bg
         self.splash.append(self._bg_group)
 
-        # show thank you and bootup file if available
-        for bootscreen in ("/thankyou.bmp", "/pyportal_startup.bmp"):
-            try:
-                os.stat(bootscreen)
-                board.DISPLAY.show(self.splash)
-                for i in range(100, -1, -1):  # dim down
-                    self.set_backlight(i/100)
-                    time.sleep(0.005)
-                self.set_background(bootscreen)
-                board.DISPLAY.wait_for_frame()
-                for i in range(100):  # dim up
-                    self.set_backlight(i/100)
-                    time.sleep(0.005)
-                time.sleep(2)
-            except OSError:
-                pass # they removed it, skip!
+        # show thank you and bootup file if available, stepped while the ESP32 comes up
+        self._boot_animation = None
+        if not fast_boot:
+            self._boot_animation = self._boot_screens(time.monotonic())
+            self._boot_step()
+        self.boot_timeline.mark("display")
 
 #        self._speaker_enable = DigitalInOut(board.SPEAKER_ENABLE)
 #        self._speaker_enable.switch_to_output(False)
@@ -270,18 +322,26 @@ class PyPortal:
                 break
             except RuntimeError:
                 print("Retrying ESP32 connection")
-                time.sleep(1)
+                self._boot_wait(1)
                 self._esp.reset()
         else:
             raise RuntimeError("Was not able to find ESP32")
         requests.set_socket(socket, self._esp)
+        self.boot_timeline.mark("esp32")
+        self._boot_step()
 
-        if url and not self._uselocal:
+        if url and not self._uselocal and not self._replaying:
             self._connect_esp()
+            self.boot_timeline.mark("wifi")
 
         if self._debug:
             print("My IP address is", self._esp.pretty_ip(self._esp.ip_address))
 
+        # let the boot screens finish what's left of their time
+        while self._boot_animation:
+            self._boot_wait(0.01)
+        self.boot_timeline.mark("boot screens")
+
         # set the default background
         self.set_background(self._default_bg)
         board.DISPLAY.show(self.splash)
@@ -297,6 +357,10 @@ class PyPortal:
         except OSError as error:
             print("No SD card found:", error)
 
+        if state_snapshot:
+            self._recovery = Recovery(STATE_FILE)
+            self.restored_state = self._recovery.load()
+
         self._qr_group = None
         # Tracks whether we've hidden the background when we showed the QR code.
         self._qr_only = False
@@ -313,6 +377,8 @@ class PyPortal:
                 num = len(text_position)
                 if not text_wrap:
                     text_wrap = [0] * num
+                if not text_wrap_width:
+                    text_wrap_width = [0] * num
                 if not text_maxlen:
                     text_maxlen = [0] * num
                 if not text_transform:
@@ -322,12 +388,17 @@ class PyPortal:
                 text_position = (text_position,)
                 text_color = (text_color,)
                 text_wrap = (text_wrap,)
+                text_wrap_width = (text_wrap_width,)
                 text_maxlen = (text_maxlen,)
                 text_transform = (text_transform,)
             self._text = [None] * num
+            self._text_string = [None] * num
+            self._text_index = [None] * num
+            self._text_max_glyphs = [0] * num
             self._text_color = [None] * num
             self._text_position = [None] * num
             self._text_wrap = [None] * num
+            self._text_wrap_width = [None] * num
             self._text_maxlen = [None] * num
             self._text_transform = [None] * num
             self._text_font = bitmap_font.load_font(text_font)
@@ -335,7 +406,7 @@ class PyPortal:
                 print("Loading font glyphs")
             # self._text_font.load_glyphs(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
             #                             b'0123456789:/-_,. ')
-            gc.collect()
+            MEM.collect()
 
             for i in range(num):
                 if self._debug:
@@ -344,6 +415,7 @@ class PyPortal:
                 self._text_color[i] = text_color[i]
                 self._text_position[i] = text_position[i]
                 self._text_wrap[i] = text_wrap[i]
+                self._text_wrap_width[i] = text_wrap_width[i]
                 self._text_maxlen[i] = text_maxlen[i]
                 self._text_transform[i] = text_transform[i]
         else:
@@ -351,6 +423,12 @@ class PyPortal:
             self._text = None
 
         self._image_json_path = image_json_path
+        # every json path (and the image path, last) merged into one tree, walked once per fetch
+        json_paths = list(self._json_path or ())
+        if image_json_path:
+            json_paths.append(image_json_path)
+        self._json_tree = PyPortal._json_compile(json_paths)
+        self._json_count = len(json_paths)
         self._image_url_path = image_url_path
         self._image_resize = image_resize
         self._image_position = image_position
@@ -361,6 +439,9 @@ class PyPortal:
                 self._image_position = (0, 0)  # default to top corner
             if not self._image_resize:
                 self._image_resize = (320, 240)  # default to full screen
+        self._image_cache = None
+        if image_json_path and self._sdcard and image_cache_quota:
+            self._image_cache = ImageCache("/sd/imgcache", image_cache_quota)
         if hasattr(board, 'TOUCH_XL'):
             if self._debug:
                 print("Init touchscreen")
@@ -382,7 +463,53 @@ class PyPortal:
         else:
             raise AttributeError('PyPortal module requires either a touchscreen or gamepad.')
 
-        gc.collect()
+        MEM.collect()
+        self.boot_timeline.mark("sd, text, input")
+        if self._debug:
+            self.boot_timeline.report()
+
+    def _boot_screens(self, start):
+        """Fade in and hold each boot screen, one small step per ``next()``. Every phase
+        ends at a fixed time after ``start``, so however often it is stepped, and however
+        long the ESP32 blocks in between, it finishes on schedule."""
+        deadline = start
+        for bootscreen in BOOT_SCREENS:
+            try:
+                os.stat(bootscreen)
+            except OSError:
+                continue # they removed it, skip!
+            board.DISPLAY.show(self.splash)
+            deadline += BOOT_FADE
+            while time.monotonic() < deadline:  # dim down
+                self.set_backlight((deadline - time.monotonic()) / BOOT_FADE)
+                yield
+            self.set_backlight(0)
+            self.set_background(bootscreen)
+            deadline += BOOT_FADE
+            while time.monotonic() < deadline:  # dim up
+                self.set_backlight(1 - (deadline - time.monotonic()) / BOOT_FADE)
+                yield
+            self.set_backlight(1)
+            deadline += BOOT_HOLD
+            while time.monotonic() < deadline:
+                yield
+
+    def _boot_step(self):
+        if self._boot_animation:
+            try:
+                next(self._boot_animation)
+            except StopIteration:
+                self._boot_animation = None
+
+    def _boot_wait(self, seconds):
+        """Sleep for ``seconds``, stepping the boot screens meanwhile."""
+        stamp = time.monotonic()
+        while self._boot_animation and time.monotonic() - stamp < seconds:
+            self._boot_step()
+            time.sleep(0.005)
+        remaining = seconds - (time.monotonic() - stamp)
+        if remaining > 0:
+            time.sleep(remaining)
 
     def set_headers(self, headers):
         """Set the headers used by fetch().
@@ -391,53 +518,72 @@ class PyPortal:
         """
         self._headers = headers
 
-    def set_background(self, file_or_color, position=None):
+    def set_background(self, file_or_color, position=None, *, wait_for_frame=False):
         """The background image to a bitmap file.
 
+        Setting the file or color already shown does nothing. Colors share one bitmap and
+        only change its palette entry.
+
         :param file_or_color: The filename of the chosen background image, or a hex color.
+        :param wait_for_frame: Wait for the display to show the change. Defaults to ``False``.
 
         """
         print("Set background to ", file_or_color)
-        while self._bg_group:
-            self._bg_group.pop()
-
         if not position:
             position = (0, 0)  # default in top corner
 
-        if not file_or_color:
-            return  # we're done, no background desired
-        if self._bg_file:
-            self._bg_file.close()
-        if isinstance(file_or_color, str): # its a filenme:
-            self._bg_file = open(file_or_color, "rb")
-            background = displayio.OnDiskBitmap(self._bg_file)
-            try:
-                self._bg_sprite = displayio.TileGrid(background,
-                                                     pixel_shader=displayio.ColorConverter(),
-                                                     position=position)
-            except TypeError:
-                self._bg_sprite = displayio.TileGrid(background,
-                                                     pixel_shader=displayio.ColorConverter(),
-                                                     x=position[0], y=position[1])
-        elif isinstance(file_or_color, int):
-            # Make a background color fill
-            color_bitmap = displayio.Bitmap(320, 240, 1)
-            color_palette = displayio.Palette(1)
-            color_palette[0] = file_or_color
-            try:
-                self._bg_sprite = displayio.TileGrid(color_bitmap,
-                                                     pixel_shader=color_palette,
-                                                     position=(0, 0))
-            except TypeError:
-                self._bg_sprite = displayio.TileGrid(color_bitmap,
-                                                     pixel_shader=color_palette,
-                                                     x=position[0], y=position[1])
+        if (self._bg_group and file_or_color == self._bg_current and
+                position == self._bg_position):
+            return  # already showing it
+        if (self._bg_group and isinstance(file_or_color, int) and file_or_color and
+                self._bg_sprite is self._bg_color_sprite):
+            self._bg_palette[0] = file_or_color  # just recolor
         else:
-            raise RuntimeError("Unknown type of background")
-        self._bg_group.append(self._bg_sprite)
+            while self._bg_group:
+                self._bg_group.pop()
+            self._bg_current = None
+            if self._bg_file:
+                # let go of the file, wget may be about to replace it
+                self._bg_file.close()
+                self._bg_file = None
+                self._bg_sprite = None
+
+            if not file_or_color:
+                return  # we're done, no background desired
+            if isinstance(file_or_color, str): # its a filenme:
+                self._bg_file = open(file_or_color, "rb")
+                background = displayio.OnDiskBitmap(self._bg_file)
+                try:
+                    self._bg_sprite = displayio.TileGrid(background,
+                                                         pixel_shader=displayio.ColorConverter(),
+                                                         position=position)
+                except TypeError:
+                    self._bg_sprite = displayio.TileGrid(background,
+                                                         pixel_shader=displayio.ColorConverter(),
+                                                         x=position[0], y=position[1])
+            elif isinstance(file_or_color, int):
+                if not self._bg_color_sprite:
+                    # Make a background color fill, once
+                    color_bitmap = displayio.Bitmap(board.DISPLAY.width, board.DISPLAY.height, 1)
+                    self._bg_palette = displayio.Palette(1)
+                    try:
+                        self._bg_color_sprite = displayio.TileGrid(color_bitmap,
+                                                                   pixel_shader=self._bg_palette,
+                                                                   position=(0, 0))
+                    except TypeError:
+                        self._bg_color_sprite = displayio.TileGrid(color_bitmap,
+                                                                   pixel_shader=self._bg_palette,
+                                                                   x=0, y=0)
+                self._bg_palette[0] = file_or_color
+                self._bg_sprite = self._bg_color_sprite
+            else:
+                raise RuntimeError("Unknown type of background")
+            self._bg_group.append(self._bg_sprite)
+        self._bg_current = file_or_color
+        self._bg_position = position
         board.DISPLAY.refresh_soon()
-        gc.collect()
-        board.DISPLAY.wait_for_frame()
+        if wait_for_frame:
+            board.DISPLAY.wait_for_frame()
 
     def set_backlight(self, val):
         """Adjust the TFT backlight.
@@ -500,6 +646,9 @@ class PyPortal:
     def set_text(self, val, index=0):
         """Display text, with indexing into our list of text boxes.
 
+        Each text box keeps one ``Label`` sized for ``text_maxlen`` (or ``TEXT_MAX_GLYPHS``)
+        glyphs, updated in place; it is only rebuilt if the text outgrows it.
+
         :param str val: The text to be displayed
         :param index: Defaults to 0.
 
@@ -508,32 +657,29 @@ class PyPortal:
             string = str(val)
             if self._text_maxlen[index]:
                 string = string[:self._text_maxlen[index]]
-            if self._text[index]:
-                # print("Replacing text area with :", string)
-                # self._text[index].text = string
-                # return
-                try:
-                    text_index = self.splash.index(self._text[index])
-                except AttributeError:
-                    for i in range(len(self.splash)):
-                        if self.splash[i] == self._text[index]:
-                            text_index = i
-                            break
-
-                self._text[index] = Label(self._text_font, text=string)
-                self._text[index].color = self._text_color[index]
-                self._text[index].x = self._text_position[index][0]
-                self._text[index].y = self._text_position[index][1]
-                self.splash[text_index] = self._text[index]
+            if string == self._text_string[index]:
+                return  # nothing changed
+            label = self._text[index]
+            if label and len(string) <= self._text_max_glyphs[index]:
+                label.text = string
+                self._text_string[index] = string
                 return
 
             if self._text_position[index]:  # if we want it placed somewhere...
                 print("Making text area with string:", string)
-                self._text[index] = Label(self._text_font, text=string)
-                self._text[index].color = self._text_color[index]
-                self._text[index].x = self._text_position[index][0]
-                self._text[index].y = self._text_position[index][1]
-                self.splash.append(self._text[index])
+                max_glyphs = max(self._text_maxlen[index] or TEXT_MAX_GLYPHS, len(string))
+                label = Label(self._text_font, text=string, max_glyphs=max_glyphs)
+                label.color = self._text_color[index]
+                label.x = self._text_position[index][0]
+                label.y = self._text_position[index][1]
+                if self._text[index]:
+                    self.splash[self._text_index[index]] = label
+                else:
+                    self._text_index[index] = len(self.splash)
+                    self.splash.append(label)
+                self._text[index] = label
+                self._text_string[index] = string
+                self._text_max_glyphs[index] = max_glyphs
 
     def neo_status(self, value):
         """The status NeoPixel.
@@ -563,18 +709,51 @@ class PyPortal:
         self._speaker_enable.value = False
 
     @staticmethod
-    def _json_traverse(json, path):
-        value = json
-        for x in path:
-            value = value[x]
-            gc.collect()
-        return value
+    def _json_compile(paths):
+        """Merge json traversal paths into a prefix tree. A node is ``[children, slots]``,
+        where ``children`` maps a key to the next node and ``slots`` lists the indices of
+        the paths that end at this node."""
+        tree = [{}, []]
+        for index, path in enumerate(paths):
+            node = tree
+            for key in path:
+                if key not in node[0]:
+                    node[0][key] = [{}, []]
+                node = node[0][key]
+            node[1].append(index)
+        return tree
+
+    @staticmethod
+    def _json_extract(json, node, values, missing):
+        """Walk ``node`` over ``json`` once, filling ``values`` by path index. Paths that
+        can't be followed get the key that failed in ``missing`` instead."""
+        for index in node[1]:
+            values[index] = json
+        for key, child in node[0].items():
+            try:
+                value = json[key]
+            except (KeyError, IndexError):
+                PyPortal._json_missing(child, key, missing)
+                continue
+            PyPortal._json_extract(value, child, values, missing)
+
+    @staticmethod
+    def _json_missing(node, key, missing):
+        for index in node[1]:
+            missing[index] = key
+        for child in node[0].values():
+            PyPortal._json_missing(child, key, missing)
 
     def get_local_time(self, location=None):
         # pylint: disable=line-too-long
         """Fetch and "set" the local time of this microcontroller to the local time at the location, using an internet time API.
 
+        The reply is assumed to be stamped halfway through the request, so half the round trip
+        (kept in ``time_rtt``) is added before setting the clock. See ``time_sync`` for
+        scheduling these calls.
+
         :param str location: Your city and country, e.g. ``"New York, US"``.
+        :return: The ``time.struct_time`` the clock was set to.
 
         """
         # pylint: enable=line-too-long
@@ -595,7 +774,9 @@ class PyPortal:
             api_url = TIME_SERVICE % (aio_username, aio_key)
         api_url += TIME_SERVICE_STRFTIME
         try:
-            response = requests.get(api_url)
+            stamp = time.monotonic()
+            response = self._requests.get(api_url)
+            self.time_rtt = time.monotonic() - stamp
             if self._debug:
                 print("Time request: ", api_url)
                 print("Time reply: ", response.text)
@@ -608,59 +789,173 @@ class PyPortal:
         except KeyError:
             raise KeyError("Was unable to lookup the time, try setting secrets['timezone'] according to http://worldtimeapi.org/timezones")  # pylint: disable=line-too-long
         year, month, mday = [int(x) for x in the_date.split('-')]
-        the_time = the_time.split('.')[0]
+        the_time, millis = the_time.split('.')
         hours, minutes, seconds = [int(x) for x in the_time.split(':')]
         now = time.struct_time((year, month, mday, hours, minutes, seconds, week_day, year_day,
                                 is_dst))
+        late = int(millis) / 1000 + self.time_rtt / 2
+        if late >= 0.5:
+            now = time.localtime(time.mktime((year, month, mday, hours, minutes, seconds,
+                                              week_day, year_day, -1)) + int(late + 0.5))
         print(now)
         rtc.RTC().datetime = now
 
         # now clean up
         response.close()
         response = None
-        gc.collect()
+        MEM.collect()
+        return now
 
-    def wget(self, url, filename, *, chunk_size=12000):
+    def wget(self, url, filename, *, chunk_size=12000, resume=True, crc=None):
+        # pylint: disable=too-many-branches, too-many-statements
         """Download a url and save to filename location, like the command wget.
 
+        Data is gathered in a buffer and written out a whole buffer at a time, so SD card
+        writes span several blocks. The download is kept as ``filename + ".part"`` until it
+        is complete, with the URL and validator (ETag or Last-Modified) it came from in
+        ``filename + ".part.json"``. A part left by an earlier attempt at the same URL is
+        resumed with ``Range`` and ``If-Range`` requests, so a changed file starts over.
+
         :param url: The URL from which to obtain the data.
         :param filename: The name of the file to save the data to.
-        :param chunk_size: how much data to read/write at a time.
+        :param chunk_size: how much data to write at a time, rounded up to 512 byte blocks.
+        :param resume: Whether to resume a partial download. Defaults to ``True``.
+        :param crc: The expected CRC32 of the file. Only checked where ``binascii.crc32``
+                    is available. Defaults to ``None``, length is checked only.
+        :return: The achieved throughput in bytes per second.
 
         """
         print("Fetching stream from", url)
+        partname = filename + ".part"
+        metaname = partname + ".json"
+        offset = 0
+        meta = None
+        if resume:
+            try:
+                with open(metaname, "r") as file:
+                    meta = json.loads(file.read())
+                if meta.get('url') == url and meta.get('validator'):
+                    offset = os.stat(partname)[6]
+            except (OSError, ValueError):
+                pass
 
         self.neo_status((100, 100, 0))
-        r = requests.get(url, stream=True)
-
+        headers = None
+        if offset:
+            headers = {'Range': 'bytes=%d-' % offset, 'If-Range': meta['validator']}
+        r = self._requests.get(url, headers=headers, stream=True)
+        status = r.status_code
+        if offset and status == 416:
+            # nothing past what we have, the part is complete if it's as long as expected
+            r.close()
+            content_length = meta.get('length') or offset
+            print("%s already downloaded, verifying" % filename)
+        elif status not in (200, 206) or (status == 206 and not offset):
+            r.close()
+            raise RuntimeError("HTTP error %d fetching %s" % (status, url))
+        else:
+            if status == 200:
+                offset = 0  # no range support, or the file changed, start over
+            content_length = offset + int(r.headers['content-length'])
         if self._debug:
             print(r.headers)
-        content_length = int(r.headers['content-length'])
-        remaining = content_length
-        print("Saving data to ", filename)
+        if not offset:
+            validator = r.headers.get('etag') or r.headers.get('last-modified')
+            try:
+                with open(metaname, "w") as file:
+                    file.write(json.dumps({'url': url, 'validator': validator,
+                                           'length': content_length}))
+            except OSError as error:
+                print("Could not save download state:", error)
+
+        size = (chunk_size + 511) // 512 * 512
+        MEM.collect()
+        buffer = memoryview(bytearray(size))
+
+        checksum = 0
+        if crc is not None and crc32 is None:
+            print("No crc32 available, only checking length")
+        elif crc is not None and offset:
+            with open(partname, "rb") as file:  # pick up the checksum of what we have
+                while True:
+                    count = file.readinto(buffer)
+                    if not count:
+                        break
+                    checksum = crc32(buffer[:count], checksum)
+
         stamp = time.monotonic()
-        file = open(filename, "wb")
-        for i in r.iter_content(min(remaining, chunk_size)):  # huge chunks!
-            self.neo_status((0, 100, 100))
-            remaining -= len(i)
-            file.write(i)
-            if self._debug:
-                print("Read %d bytes, %d remaining" % (content_length-remaining, remaining))
+        received = offset
+        if status != 416:
+            if offset:
+                print("Resuming %s at %d bytes" % (filename, offset))
             else:
-                print(".", end='')
-            if not remaining:
-                break
-            self.neo_status((100, 100, 0))
-        file.close()
-
-        r.close()
+                print("Saving data to ", filename)
+            self.neo_status((0, 100, 100))
+            fill = 0
+            file = open(partname, "ab" if offset else "wb")
+            try:
+                for chunk in r.iter_content(min(content_length - offset, size)):
+                    chunk = memoryview(chunk)
+                    while chunk:
+                        count = min(len(chunk), size - fill)
+                        buffer[fill:fill + count] = chunk[:count]
+                        chunk = chunk[count:]
+                        fill += count
+                        if fill == size:
+                            file.write(buffer)
+                            if crc is not None and crc32:
+                                checksum = crc32(buffer, checksum)
+                            received += fill
+                            fill = 0
+                            if self._debug:
+                                print("Read %d bytes, %d remaining" % (received,
+                                                                       content_length - received))
+                    if received + fill >= content_length:
+                        break
+                if fill:
+                    file.write(buffer[:fill])
+                    if crc is not None and crc32:
+                        checksum = crc32(buffer[:fill], checksum)
+                    received += fill
+            finally:
+                file.close()
+                r.close()
+        buffer = None
+        MEM.collect()
         stamp = time.monotonic() - stamp
-        print("Created file of %d bytes in %0.1f seconds" % (os.stat(filename)[6], stamp))
         self.neo_status((0, 0, 0))
-        if not content_length == os.stat(filename)[6]:
-            raise RuntimeError
+
+        got = os.stat(partname)[6]
+        if content_length != got:
+            if status == 416:
+                self._wget_discard(partname, metaname)  # can't be resumed, start over next time
+            raise RuntimeError("Got %d of %d bytes" % (got, content_length))
+        if crc is not None and crc32 and checksum != crc:
+            self._wget_discard(partname, metaname)
+            raise RuntimeError("Checksum mismatch")
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+        os.rename(partname, filename)
+        self._wget_discard(metaname)
+
+        rate = (received - offset) / max(stamp, 0.001)
+        print("Created file of %d bytes in %0.1f seconds (%0.1f KB/s)" %
+              (content_length, stamp, rate / 1024))
+        return rate
+
+    @staticmethod
+    def _wget_discard(*filenames):
+        for name in filenames:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
 
     def _connect_esp(self):
+        if self._replaying:
+            return
         self.neo_status((0, 0, 100))
         while not self._esp.is_connected:
             # secrets dictionary must contain 'ssid' and 'password' at a minimum
@@ -674,12 +969,13 @@ class PyPortal:
                 change_me += "*"*45
                 raise OSError(change_me)
             self.neo_status((100, 0, 0)) # red = not connected
+            self._boot_step()
             try:
                 self._esp.connect(secrets)
             except RuntimeError as error:
                 print("Could not connect to internet", error)
                 print("Retrying in 3 seconds...")
-                time.sleep(3)
+                self._boot_wait(3)
 
     @staticmethod
     def image_converter_url(image_url, width, height, color_depth=16):
@@ -696,6 +992,58 @@ class PyPortal:
                                           width, height,
                                           color_depth, image_url)
 
+    def _io_client(self):
+        """The Adafruit IO client, created on first use and kept for later pushes."""
+        if self._io is None:
+            try:
+                aio_username = secrets['aio_username']
+                aio_key = secrets['aio_key']
+            except KeyError:
+                raise KeyError("Adafruit IO secrets are kept in secrets.py, please add them there!\n\n")
+            wifi = adafruit_esp32spi_wifimanager.ESPSPI_WiFiManager(self._esp, secrets, None)
+            self._io = IO_HTTP(aio_username, aio_key, wifi)
+            if self._sdcard:
+                try:
+                    with open(IO_FEEDS_FILE, "r") as file:
+                        self._io_feeds = json.loads(file.read())
+                except (OSError, ValueError):
+                    pass
+        return self._io
+
+    def _io_retry(self, func, *args):
+        """Call ``func`` with bounded retries, backing off 1, 2, 4... seconds between tries."""
+        delay = 1
+        for attempt in range(IO_RETRIES):
+            try:
+                return func(*args)
+            except RuntimeError as exception:
+                if attempt == IO_RETRIES - 1:
+                    raise
+                print("An error occured, retrying in %d seconds -" % delay, exception)
+                time.sleep(delay)
+                delay *= 2
+        return None
+
+    def _io_feed(self, feed_key):
+        """The key to send to for ``feed_key``, looked up (or created) only once."""
+        key = self._io_feeds.get(feed_key)
+        if key:
+            return key
+        io_client = self._io_client()
+        try:
+            feed = self._io_retry(io_client.get_feed, feed_key)
+        except AdafruitIO_RequestError:
+            # If no feed exists, create one
+            feed = self._io_retry(io_client.create_new_feed, feed_key)
+        key = self._io_feeds[feed_key] = feed['key']
+        if self._sdcard:
+            try:
+                with open(IO_FEEDS_FILE, "w") as file:
+                    file.write(json.dumps(self._io_feeds))
+            except OSError as error:
+                print("Could not save feed keys:", error)
+        return key
+
     def push_to_io(self, feed_key, data):
         # pylint: disable=line-too-long
         """Push data to an adafruit.io feed
@@ -705,50 +1053,36 @@ class PyPortal:
 
         """
         # pylint: enable=line-too-long
+        self._io_retry(self._io_client().send_data, self._io_feed(feed_key), data)
 
-        try:
-            aio_username = secrets['aio_username']
-            aio_key = secrets['aio_key']
-        except KeyError:
-            raise KeyError("Adafruit IO secrets are kept in secrets.py, please add them there!\n\n")
+    def push_many(self, feeds):
+        """Push several values to adafruit.io feeds, sharing one client.
 
-        wifi = adafruit_esp32spi_wifimanager.ESPSPI_WiFiManager(self._esp, secrets, None)
-        io_client = IO_HTTP(aio_username, aio_key, wifi)
+        :param feeds: A dict of feed key to value, or a list of ``(feed_key, value)`` pairs.
 
-        while True:
-            try:
-                feed_id = io_client.get_feed(feed_key)
-            except AdafruitIO_RequestError:
-                # If no feed exists, create one
-                feed_id = io_client.create_new_feed(feed_key)
-            except RuntimeError as exception:
-                print("An error occured, retrying! 1 -", exception)
-                continue
-            break
-
-        while True:
-            try:
-                io_client.send_data(feed_id['key'], data)
-            except RuntimeError as exception:
-                print("An error occured, retrying! 2 -", exception)
-                continue
-            except NameError as exception:
-                print(feed_id['key'], data, exception)
-                continue
-            break
+        """
+        if isinstance(feeds, dict):
+            feeds = feeds.items()
+        io_client = self._io_client()
+        for feed_key, data in feeds:
+            self._io_retry(io_client.send_data, self._io_feed(feed_key), data)
 
     def fetch(self, refresh_url=None):
         """Fetch data from the url we initialized with, perfom any parsing,
         and display text or graphics. This function does pretty much everything
         Optionally update the URL
+
+        With ``mem_stats.MEM.enabled`` set, heap use is recorded per stage, and under
+        CPython the lines that allocated the most during the fetch are printed.
         """
+        MEM.begin_frame()
         if refresh_url:
             self._url = refresh_url
         json_out = None
         image_url = None
         values = []
 
-        gc.collect()
+        MEM.collect()
         if self._debug:
             print("Free mem: ", gc.mem_free())  # pylint: disable=no-member
 
@@ -758,13 +1092,19 @@ class PyPortal:
             r = Fake_Requests(LOCALFILE)
 
         if not r:
+            stamp = PERF.start()
             self._connect_esp()
+            PERF.stop("wifi", stamp)
             # great, lets get the data
             print("Retrieving data...", end='')
             self.neo_status((100, 100, 0))   # yellow = fetching data
-            gc.collect()
-            r = requests.get(self._url, headers=self._headers)
-            gc.collect()
+            MEM.collect()
+            stamp = PERF.start()
+            MEM.begin("http")
+            r = self._requests.get(self._url, headers=self._headers)
+            MEM.end("http")
+            PERF.stop("http", stamp)
+            MEM.collect()
             self.neo_status((0, 0, 100))   # green = got data
             print("Reply is OK!")
 
@@ -773,13 +1113,22 @@ class PyPortal:
 
         if self._image_json_path or self._json_path:
             try:
-                gc.collect()
+                MEM.collect()
+                stamp = PERF.start()
+                MEM.begin("json")
                 json_out = r.json()
-                gc.collect()
+                MEM.end("json")
+                PERF.stop("json", stamp)
+                MEM.collect()
             except ValueError:            # failed to parse?
                 print("Couldn't parse json: ", r.text)
                 raise
             except MemoryError:
+                MEM.report()
+                if self._state_snapshot:
+                    self._recovery.save(self._state_snapshot(), force=True)
+                if self._image_cache:
+                    self._image_cache.flush()
                 supervisor.reload()
 
         if self._regexp_path:
@@ -788,14 +1137,17 @@ class PyPortal:
         if self._image_url_path:
             image_url = self._image_url_path
 
-        # extract desired text/values from json
+        # extract desired text/values from json, all paths in a single walk
+        if json_out is not None:
+            extracted = [None] * self._json_count
+            missing = {}
+            PyPortal._json_extract(json_out, self._json_tree, extracted, missing)
         if self._json_path:
-            for path in self._json_path:
-                try:
-                    values.append(PyPortal._json_traverse(json_out, path))
-                except KeyError:
+            for i in range(len(self._json_path)):
+                if i in missing:
                     print(json_out)
-                    raise
+                    raise KeyError(missing[i])
+            values = extracted[:len(self._json_path)]
         elif self._regexp_path:
             for regexp in self._regexp_path:
                 values.append(re.search(regexp, r.text).group(1))
@@ -803,52 +1155,79 @@ class PyPortal:
             values = r.text
 
         if self._image_json_path:
-            try:
-                image_url = PyPortal._json_traverse(json_out, self._image_json_path)
-            except KeyError as error:
-                print("Error finding image data. '" + error.args[0] + "' not found.")
+            if self._json_count - 1 in missing:
+                print("Error finding image data. '" + str(missing[self._json_count - 1]) +
+                      "' not found.")
                 self.set_background(self._default_bg)
+            else:
+                image_url = extracted[-1]
+        extracted = None
 
         # we're done with the requests object, lets delete it so we can do more!
         json_out = None
         r = None
-        gc.collect()
+        MEM.collect()
 
         if image_url:
             try:
                 print("original URL:", image_url)
-                image_url = self.image_converter_url(image_url,
-                                                     self._image_resize[0],
-                                                     self._image_resize[1])
-                print("convert URL:", image_url)
-                # convert image to bitmap and cache
-                #print("**not actually wgetting**")
-                filename = "/cache.bmp"
-                chunk_size = 12000      # default chunk size is 12K (for QSPI)
-                if self._sdcard:
-                    filename = "/sd" + filename
-                    chunk_size = 512  # current bug in big SD writes -> stick to 1 block
-                try:
-                    self.wget(image_url, filename, chunk_size=chunk_size)
-                except OSError as error:
-                    print(error)
-                    raise OSError("""\n\nNo writable filesystem found for saving datastream. Insert an SD card or set internal filesystem to be unsafe by setting 'disable_concurrent_write_protection' in the mount options in boot.py""") # pylint: disable=line-too-long
-                except RuntimeError as error:
-                    print(error)
-                    raise RuntimeError("wget didn't write a complete file")
+                filename = None
+                if self._image_cache:
+                    key = cache_key(image_url, self._image_resize[0], self._image_resize[1])
+                    filename = self._image_cache.lookup(key, image_url)
+                if filename:
+                    print("Using cached image", filename)
+                else:
+                    source_url = image_url
+                    image_url = self.image_converter_url(image_url,
+                                                         self._image_resize[0],
+                                                         self._image_resize[1])
+                    print("convert URL:", image_url)
+                    # convert image to bitmap and cache
+                    #print("**not actually wgetting**")
+                    filename = "/cache.bmp"
+                    chunk_size = 12000      # default chunk size is 12K (for QSPI)
+                    if self._image_cache:
+                        filename = self._image_cache.filename(key)
+                        chunk_size = 4096  # whole 512 byte blocks, written 8 at a time
+                    elif self._sdcard:
+                        filename = "/sd" + filename
+                        chunk_size = 4096  # whole 512 byte blocks, written 8 at a time
+                    if filename == self._bg_current:
+                        # let go of the file we're about to replace
+                        self.set_background(self._default_bg)
+                    try:
+                        stamp = PERF.start()
+                        MEM.begin("image")
+                        self.wget(image_url, filename, chunk_size=chunk_size)
+                        MEM.end("image")
+                        PERF.stop("image", stamp)
+                    except OSError as error:
+                        print(error)
+                        raise OSError("""\n\nNo writable filesystem found for saving datastream. Insert an SD card or set internal filesystem to be unsafe by setting 'disable_concurrent_write_protection' in the mount options in boot.py""") # pylint: disable=line-too-long
+                    except RuntimeError as error:
+                        print(error)
+                        raise RuntimeError("wget didn't write a complete file")
+                    if self._image_cache:
+                        self._image_cache.add(key, source_url)
                 self.set_background(filename, self._image_position)
+                if self._image_cache:
+                    # keep the use counts, so eviction order survives a reload
+                    self._image_cache.flush()
             except ValueError as error:
                 print("Error displaying cached image. " + error.args[0])
                 self.set_background(self._default_bg)
             finally:
                 image_url = None
-                gc.collect()
+                MEM.collect()
 
         # if we have a callback registered, call it now
         if self._success_callback:
             self._success_callback(values)
 
         # fill out all the text blocks
+        stamp = PERF.start()
+        MEM.begin("text")
         if self._text:
             for i in range(len(self._text)):
                 string = None
@@ -862,12 +1241,20 @@ class PyPortal:
                         string = values[i] # ok its a string
                 if self._debug:
                     print("Drawing text", string)
-                if self._text_wrap[i]:
+                if self._text_wrap_width[i]:
+                    if self._debug:
+                        print("Wrapping text to", self._text_wrap_width[i], "pixels")
+                    lines = self.wrap_to_width(string, self._text_wrap_width[i])
+                    string = '\n'.join(lines)
+                elif self._text_wrap[i]:
                     if self._debug:
                         print("Wrapping text")
                     lines = PyPortal.wrap_nicely(string, self._text_wrap[i])
                     string = '\n'.join(lines)
                 self.set_text(string, index=i)
+        MEM.end("text")
+        PERF.stop("text", stamp)
+        MEM.end_frame()
         if len(values) == 1:
             return values[0]
         return values
@@ -882,27 +1269,8 @@ class PyPortal:
         :param hide_background: Show the QR code on a black background if True.
 
         """
-        import adafruit_miniqr
-        # generate the QR code
-        qrcode = adafruit_miniqr.QRCode()
-        qrcode.add_data(qr_data)
-        qrcode.make()
-
-        # monochrome (2 color) palette
-        palette = displayio.Palette(2)
-        palette[0] = 0xFFFFFF
-        palette[1] = 0x000000
-
-        # pylint: disable=invalid-name
-        # bitmap the size of the matrix, plus border, monochrome (2 colors)
-        qr_bitmap = displayio.Bitmap(qrcode.matrix.width + 2, qrcode.matrix.height + 2, 2)
-        for i in range(qr_bitmap.width * qr_bitmap.height):
-            qr_bitmap[i] = 0
-
-        # transcribe QR code into bitmap
-        for xx in range(qrcode.matrix.width):
-            for yy in range(qrcode.matrix.height):
-                qr_bitmap[xx+1, yy+1] = 1 if qrcode.matrix[xx, yy] else 0
+        # generate the QR code, or reuse it if we've shown this data recently
+        qr_bitmap, palette = qr_render.qr_bitmap(qr_data)
 
         # display the QR code
         qr_sprite = displayio.TileGrid(qr_bitmap, pixel_shader=palette)
@@ -944,17 +1312,16 @@ class PyPortal:
 
         """
         string = string.replace('\n', '').replace('\r', '') # strip confusing newlines
-        words = string.split(' ')
-        the_lines = []
-        the_line = ""
-        for w in words:
-            if len(the_line+' '+w) <= max_chars:
-                the_line += ' '+w
-            else:
-                the_lines.append(the_line)
-                the_line = ''+w
-        if the_line:      # last line remaining
-            the_lines.append(the_line)
-        # remove first space from first line:
-        the_lines[0] = the_lines[0][1:]
-        return the_lines
\ No newline at end of file
+        return text_layout.wrap_chars(string, max_chars)
+
+    def wrap_to_width(self, string, width, font=None):
+        """A helper that will return a list of lines with word-break wrapping, measured
+        against the glyph widths of the font.
+
+        :param str string: The text to be wrapped.
+        :param int width: The widest a line may be, in pixels.
+        :param font: The ``bitmap_font`` font the text is shown in. Defaults to the text font.
+
+        """
+        string = string.replace('\n', '').replace('\r', '') # strip confusing newlines
+        return text_layout.wrap_bdf(string, width, font or self._text_font)
\ No newline at end of file
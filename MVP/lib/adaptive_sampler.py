@@ -0,0 +1,91 @@
+"""
+`adaptive_sampler`
+================================================================================
+
+Sampling and upload scheduling driven by how much the readings change.
+
+Each quantity has a dead-band: changes smaller than it, measured against the
+last value uploaded, don't count. While nothing counts, the sampling interval
+doubles up to ``max_interval``; as soon as something does, it drops back to
+``min_interval``. Only the quantities that changed are uploaded, and everything
+is uploaded at least every ``heartbeat`` seconds so dashboards can tell a quiet
+room from a dead station.
+
+Typical use::
+
+    sampler = AdaptiveSampler({"temperature": 0.2, "humidity": 1})
+    while True:
+        readings = {"temperature": ..., "humidity": ...}
+        changed = sampler.changes(readings)
+        ... upload the changed readings ...
+        sampler.sent(readings, changed)
+        time.sleep(sampler.seconds_to_next())
+
+* Author(s): SmartMirror+ team
+"""
+
+import time
+
+
+class AdaptiveSampler:
+    """Decides when to sample next and which readings are worth uploading.
+
+    :param dict deadbands: The smallest change that counts, by quantity name.
+    :param min_interval: Seconds between samples while readings are changing.
+    :param max_interval: The most seconds between samples while readings are stable.
+    :param heartbeat: Upload every quantity at least this often, in seconds.
+
+    """
+    def __init__(self, deadbands, *, min_interval=5, max_interval=300, heartbeat=900):
+        self.deadbands = deadbands
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.heartbeat = heartbeat
+        self.interval = min_interval
+        self.samples = 0
+        self.uploads = 0
+        self._uploaded = {}       # the last value uploaded, by quantity name
+        self._last_upload = None  # time.monotonic() of the last heartbeat
+        self._next = 0
+
+    @property
+    def due(self):
+        """Whether it is time to take the next sample."""
+        return time.monotonic() >= self._next
+
+    def seconds_to_next(self):
+        """Seconds until the next sample is due, ``0`` if it already is."""
+        return max(0, self._next - time.monotonic())
+
+    def changes(self, readings):
+        """Take a sample and schedule the next one.
+
+        :param dict readings: The current values, by quantity name.
+        :return: The names of the quantities to upload, empty if there's nothing worth sending.
+
+        """
+        now = time.monotonic()
+        self.samples += 1
+        changed = []
+        for name in self.deadbands:
+            last = self._uploaded.get(name)
+            if last is None or abs(readings[name] - last) >= self.deadbands[name]:
+                changed.append(name)
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        self._next = now + self.interval
+        if self._last_upload is None or now - self._last_upload >= self.heartbeat:
+            return list(self.deadbands)
+        return changed
+
+    def sent(self, readings, names):
+        """Record that ``names`` were uploaded, call once the upload succeeded."""
+        if not names:
+            return
+        for name in names:
+            self._uploaded[name] = readings[name]
+        if len(names) == len(self.deadbands):
+            self._last_upload = time.monotonic()
+        self.uploads += 1
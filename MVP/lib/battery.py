@@ -0,0 +1,148 @@
+"""
+`battery`
+================================================================================
+
+Battery monitoring and the power policy that follows from it.
+
+A single ADC read of the battery pin is noisy, so ``read_voltage()``
+oversamples it, and ``BatteryMonitor`` filters those readings further with an
+exponential moving average. The voltage maps to a state of charge through a
+typical LiPo discharge curve. The charge in turn picks a ``PowerPolicy``, which
+says how much to dim the display and how much to stretch refresh and time
+sync intervals. Runtime is estimated from how fast the charge is falling.
+
+Typical use::
+
+    monitor = BatteryMonitor(analogio.AnalogIn(board.BATTERY))
+    while True:
+        if monitor.update():
+            policy = monitor.policy
+            ...
+
+* Author(s): SmartMirror+ team
+"""
+
+import time
+from collections import namedtuple
+
+# display brightness (0-1), and multipliers for refresh and time sync intervals
+PowerPolicy = namedtuple("PowerPolicy", ["name", "brightness", "refresh", "sync"])
+
+# (lowest state of charge in %, policy), highest first
+POLICIES = (
+    (50, PowerPolicy("normal", 1.0, 1, 1)),
+    (25, PowerPolicy("saver", 0.6, 2, 2)),
+    (10, PowerPolicy("low", 0.3, 4, 4)),
+    (0, PowerPolicy("critical", 0.1, 8, 8)),
+)
+HYSTERESIS = 3  # % of charge above a threshold before moving back up a policy
+
+# (volts, state of charge in %) of a resting LiPo cell, highest first
+DISCHARGE_CURVE = ((4.20, 100), (4.10, 90), (4.00, 80), (3.90, 65), (3.80, 50), (3.75, 40),
+                   (3.70, 30), (3.65, 20), (3.60, 10), (3.50, 5), (3.30, 0))
+
+
+def read_voltage(adc, samples=16, divider=2, reference=3.3):
+    """The battery voltage, averaged over ``samples`` ADC reads.
+
+    :param adc: The ``analogio.AnalogIn`` on the battery pin.
+    :param int samples: How many reads to average.
+    :param float divider: The battery voltage is this many times what the pin sees.
+    :param float reference: The ADC reference voltage.
+
+    """
+    total = 0
+    for _ in range(samples):
+        total += adc.value
+    return total * reference * divider / (samples * 65536)
+
+
+def state_of_charge(voltage):
+    """Percent charge left for a LiPo cell at ``voltage``."""
+    above = DISCHARGE_CURVE[0]
+    if voltage >= above[0]:
+        return 100
+    for point in DISCHARGE_CURVE[1:]:
+        if voltage >= point[0]:
+            return point[1] + (above[1] - point[1]) * (voltage - point[0]) / (above[0] - point[0])
+        above = point
+    return 0
+
+
+class BatteryMonitor:
+    """Filtered battery voltage, charge, runtime and power policy.
+
+    :param adc: The ``analogio.AnalogIn`` on the battery pin.
+    :param int interval: Seconds between readings.
+    :param int samples: ADC reads averaged per reading.
+    :param float smoothing: How far each reading moves the filtered voltage, 0-1.
+    :param float divider: The battery voltage is this many times what the pin sees.
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, adc, *, interval=10, samples=16, smoothing=0.2, divider=2):
+        self._adc = adc
+        self.interval = interval
+        self.samples = samples
+        self.smoothing = smoothing
+        self.divider = divider
+        self.voltage = None
+        self.charge = None
+        self.policy = POLICIES[0][1]
+        self._last = None
+        self._reference = None  # (time.monotonic(), charge) the discharge rate is measured from
+        self._rate = None       # % of charge used per second
+
+    def update(self):
+        """Take a reading if one is due. Returns ``True`` if the policy changed."""
+        now = time.monotonic()
+        if self._last is not None and now - self._last < self.interval:
+            return False
+        self._last = now
+        voltage = read_voltage(self._adc, self.samples, self.divider)
+        if self.voltage is None:
+            self.voltage = voltage
+        else:
+            self.voltage += (voltage - self.voltage) * self.smoothing
+        self.charge = state_of_charge(self.voltage)
+        self._track_rate(now)
+        return self._choose_policy()
+
+    def _track_rate(self, now):
+        if self._reference is None or self.charge > self._reference[1] + 2:
+            # first reading, or charging, start measuring again
+            self._reference = (now, self.charge)
+            self._rate = None
+            return
+        used = self._reference[1] - self.charge
+        if used >= 2:  # enough of a drop to measure through the noise
+            self._rate = used / (now - self._reference[0])
+
+    def _choose_policy(self):
+        for index, (threshold, policy) in enumerate(POLICIES):
+            if self.charge >= threshold:
+                break
+        current = self._policy_index()
+        if index == current:
+            return False
+        if index < current:
+            # moving to a better policy, one at a time and only once comfortably above its threshold
+            threshold, policy = POLICIES[current - 1]
+            if self.charge < threshold + HYSTERESIS:
+                return False
+        self.policy = policy
+        print("Battery %d%%, power policy: %s" % (self.charge, policy.name))
+        return True
+
+    def _policy_index(self):
+        for index, entry in enumerate(POLICIES):
+            if entry[1] is self.policy:
+                return index
+        return 0
+
+    @property
+    def runtime(self):
+        """Estimated seconds of battery left, ``None`` until the discharge rate is known."""
+        if not self._rate:
+            return None
+        return self.charge / self._rate
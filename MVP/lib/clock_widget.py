@@ -0,0 +1,181 @@
+"""
+`clock_widget`
+================================================================================
+
+Minute clock for the mirror front-ends.
+
+``MinuteClock`` keeps the time of day, either from ``time.localtime()`` or from
+an occasional internet sync carried forward on ``time.monotonic()``, and formats
+it at most once a minute from cached hour and minute strings.
+``RA8875Clock`` draws the string on an RA8875 display, erasing and rewriting
+only the character cells that differ from what is already on screen, so most
+minutes cost a single character.
+
+Typical use::
+
+    clock = MinuteClock(am_pm=True)
+    face = RA8875Clock(display, 530, 0)
+    while True:
+        face.draw(clock.text())
+        ...
+
+* Author(s): SmartMirror+ team
+"""
+
+import time
+
+_MINUTES = None  # "00" to "59"
+_HOURS = {}      # am_pm -> 24 (prefix, suffix) pairs
+
+
+def format_time(hour, minute, am_pm=True):
+    """Format a time of day as ``"9:05 PM"``, or ``"21:05"`` if ``am_pm`` is ``False``."""
+    global _MINUTES  # pylint: disable=global-statement
+    if _MINUTES is None:
+        _MINUTES = tuple("%02d" % m for m in range(60))
+    hours = _HOURS.get(am_pm)
+    if hours is None:
+        if am_pm:
+            hours = tuple(("%d:" % (h % 12 or 12), " PM" if h >= 12 else " AM")
+                          for h in range(24))
+        else:
+            hours = tuple(("%d:" % h, "") for h in range(24))
+        _HOURS[am_pm] = hours
+    prefix, suffix = hours[hour]
+    return prefix + _MINUTES[minute] + suffix
+
+
+class MinuteClock:
+    """The time of day, formatted once per minute.
+
+    Until ``set_time()`` is called the time comes from ``time.localtime()``, so on a
+    board whose RTC is already set nothing else is needed.
+
+    :param bool am_pm: 12 hour time with AM/PM, otherwise 24 hour time.
+    :param int sync_interval: Seconds after ``set_time()`` until ``sync_due`` is set again.
+
+    """
+    def __init__(self, *, am_pm=True, sync_interval=3600):
+        self.am_pm = am_pm
+        self.sync_interval = sync_interval
+        self._base = None       # seconds since midnight at time.monotonic() == 0
+        self._synced_at = None
+        self._text = None
+        self._text_minute = None
+
+    def set_time(self, hour, minute, second=0):
+        """Set the time of day, e.g. from an internet time server."""
+        now = time.monotonic()
+        self._base = hour * 3600 + minute * 60 + second - now
+        self._synced_at = now
+
+    def snapshot(self):
+        """The last ``set_time()`` as a JSON friendly list, ``None`` if there wasn't one.
+        It only changes on a sync, so saving it now and then costs nothing."""
+        if self._synced_at is None:
+            return None
+        return [self._base, self._synced_at]
+
+    def restore(self, snapshot):
+        """Carry on from a ``snapshot()``, e.g. after ``supervisor.reload()``. The time is
+        only exact while ``time.monotonic()`` has kept running since the snapshot, so after a
+        reset nothing is restored. Returns whether the time was restored."""
+        base, synced_at = snapshot
+        if time.monotonic() < synced_at:
+            return False  # the monotonic clock started again, the board was reset
+        self._base = base
+        self._synced_at = synced_at
+        return True
+
+    @property
+    def synced(self):
+        """Whether the time has been set, by ``set_time()`` or ``restore()``."""
+        return self._base is not None
+
+    @property
+    def sync_due(self):
+        """Whether it is time to call ``set_time()`` again."""
+        return (self._synced_at is None or
+                time.monotonic() - self._synced_at >= self.sync_interval)
+
+    def seconds(self):
+        """Seconds since midnight."""
+        if self._base is None:
+            now = time.localtime()
+            return now[3] * 3600 + now[4] * 60 + now[5]
+        return (time.monotonic() + self._base) % 86400
+
+    def seconds_to_next_minute(self):
+        """Seconds until the displayed time next changes."""
+        return 60 - self.seconds() % 60
+
+    def text(self):
+        """The formatted time, only reformatted when the minute has changed."""
+        minute = int(self.seconds()) // 60
+        if minute != self._text_minute:
+            self._text = format_time(minute // 60, minute % 60, self.am_pm)
+            self._text_minute = minute
+        return self._text
+
+
+class RA8875Clock:
+    """Draws a changing string on an RA8875 display one character cell at a time.
+
+    If ``display`` is a ``fast_boot.FrameRecorder``, the changed cells are drawn
+    unrecorded and the whole string is noted in every frame, so a repainted frame
+    shows the full time.
+
+    :param display: The ``adafruit_ra8875`` display, or a ``FrameRecorder`` around it.
+    :param int x: The x position of the first character.
+    :param int y: The y position of the first character.
+    :param int txt_size: The RA8875 text size, 0-3. A cell is ``8 * (txt_size + 1)`` pixels
+                         wide and ``16 * (txt_size + 1)`` high.
+    :param color: The RGB565 text color.
+    :param background: The RGB565 color cells are erased to.
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, display, x, y, *, txt_size=3, color=0xFFFF, background=0x0000):
+        self._display = getattr(display, "raw", display)
+        self._note = getattr(display, "note", None)
+        self.x = x
+        self.y = y
+        self.txt_size = txt_size
+        self.color = color
+        self.background = background
+        self.redraws = 0
+        self._drawn = ""
+
+    def invalidate(self):
+        """Forget what is on screen, call after clearing the display."""
+        self._drawn = ""
+
+    def draw(self, text):
+        """Show ``text``, returns how many character cells were redrawn."""
+        count = 0
+        if text != self._drawn:
+            display = self._display
+            old = self._drawn
+            width = 8 * (self.txt_size + 1)
+            height = 16 * (self.txt_size + 1)
+            display.txt_size(self.txt_size)
+            display.txt_trans(self.color)
+            for i in range(max(len(text), len(old))):
+                char = text[i] if i < len(text) else " "
+                if i < len(old) and old[i] == char:
+                    continue
+                cell_x = self.x + i * width
+                if i < len(old) and old[i] != " ":
+                    display.fill_rect(cell_x, self.y, width, height, self.background)
+                if char != " ":
+                    display.txt_set_cursor(cell_x, self.y)
+                    display.txt_write(char)
+                count += 1
+            self._drawn = text
+            self.redraws += 1
+        if self._note:
+            self._note("txt_size", self.txt_size)
+            self._note("txt_trans", self.color)
+            self._note("txt_set_cursor", self.x, self.y)
+            self._note("txt_write", text)
+        return count
@@ -0,0 +1,217 @@
+"""
+`fast_boot`
+================================================================================
+
+Helpers for getting a useful screen up quickly after power-on.
+
+* ``BootTimeline`` marks boot stages and reports the milliseconds spent in each.
+* ``LazyModule`` defers importing a driver until it is first used.
+* ``BootTasks`` steps slow bring-up work (ESP32, Wi-Fi, sensors) a little at a
+  time from the main loop, so the display is live while it happens.
+* ``FrameRecorder`` wraps an RA8875 display, records the text and bitmap
+  operations of the current frame and saves them to SD, so the next boot can
+  repaint the last frame before anything else is initialised.
+
+* Author(s): SmartMirror+ team
+"""
+
+import time
+import json
+
+
+class BootTimeline:
+    """Milliseconds spent in each boot stage.
+
+    ``time.monotonic()`` counts from power-on on CircuitPython, so the report also
+    shows how long after power-on each stage finished.
+    """
+    def __init__(self):
+        self._last = time.monotonic_ns()
+        self.stages = []
+
+    def mark(self, name):
+        """Close the current stage and name it ``name``."""
+        now = time.monotonic_ns()
+        self.stages.append((name, (now - self._last) // 1000000, now // 1000000))
+        self._last = now
+
+    def add(self, name, millis):
+        """Record a stage timed elsewhere, e.g. one interleaved with the main loop."""
+        self.stages.append((name, millis, time.monotonic_ns() // 1000000))
+
+    def report(self):
+        """Print the boot timeline over serial."""
+        print("%-16s %8s %10s" % ("boot stage", "ms", "since on"))
+        for name, millis, since in self.stages:
+            print("%-16s %8d %10d" % (name, millis, since))
+
+
+class LazyModule:
+    """Stand-in for a module that is only imported on first attribute access.
+
+    :param str name: The full dotted module name, e.g. ``"adafruit_bme680"``.
+    :param BootTimeline timeline: If given, the import time is recorded in it.
+
+    """
+    def __init__(self, name, timeline=None):
+        self._name = name
+        self._timeline = timeline
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            stamp = time.monotonic_ns()
+            self._module = __import__(self._name, None, None, ["_"])
+            if self._timeline:
+                self._timeline.add("import " + self._name,
+                                   (time.monotonic_ns() - stamp) // 1000000)
+        return getattr(self._module, attr)
+
+
+class BootTasks:
+    """Cooperative background bring-up.
+
+    Each task is a generator function; ``step()`` runs the next piece of the first
+    unfinished task, up to its next ``yield``. Tasks run in the order they were added.
+    A task that raises is moved to ``failed`` with its error, never to ``finished``,
+    and the next task carries on. ``retry()`` queues failed tasks again.
+
+    :param BootTimeline timeline: If given, the time spent inside each task is recorded in it.
+
+    """
+    def __init__(self, timeline=None):
+        self._timeline = timeline
+        self._tasks = []
+        self._pending = []
+        self._spent = 0
+        self.finished = set()
+        self.failed = {}
+
+    def add(self, name, task):
+        """Queue generator function ``task`` under ``name``."""
+        self._tasks.append((name, task))
+        self._pending.append((name, task()))
+
+    def retry(self):
+        """Queue the failed tasks again, in the order they were added. Returns ``True`` if
+        there were any."""
+        for name, task in self._tasks:
+            if name in self.failed:
+                del self.failed[name]
+                self._pending.append((name, task()))
+        return bool(self._pending)
+
+    def step(self):
+        """Advance the current task, returns ``False`` once everything is done or failed."""
+        if not self._pending:
+            return False
+        name, task = self._pending[0]
+        stamp = time.monotonic_ns()
+        try:
+            next(task)
+            self._spent += time.monotonic_ns() - stamp
+        except StopIteration:
+            self._end(name, stamp)
+            self.finished.add(name)
+        except Exception as error:  # pylint: disable=broad-except
+            self._end(name, stamp)
+            self.failed[name] = error
+            print("Bring-up of %s failed: %s" % (name, error))
+            if isinstance(error, MemoryError):
+                raise
+        return bool(self._pending)
+
+    def _end(self, name, stamp):
+        self._spent += time.monotonic_ns() - stamp
+        self._pending.pop(0)
+        if self._timeline:
+            self._timeline.add(name, self._spent // 1000000)
+        self._spent = 0
+
+    def done(self, name):
+        """Whether task ``name`` has completed."""
+        return name in self.finished
+
+
+_RECORDED = ("txt_set_cursor", "txt_size", "txt_trans", "txt_color", "txt_write",
+             "fill", "fill_rect")
+
+
+class FrameRecorder:
+    """Pass-through wrapper for an RA8875 display that remembers the current frame.
+
+    Text and fill calls are recorded as they are forwarded; bitmaps are recorded with
+    ``note_bitmap()``. ``init()`` starts a new frame.
+
+    :param display: The ``adafruit_ra8875`` display to wrap.
+    :param str filename: Where the last frame is kept, e.g. ``"/sd/last_frame.json"``.
+
+    """
+    def __init__(self, display, filename):
+        self._display = display
+        self._filename = filename
+        self._ops = []
+        self._saved = None
+
+    def __getattr__(self, attr):
+        method = getattr(self._display, attr)
+        if attr not in _RECORDED:
+            return method
+        def recorded(*args):
+            self._ops.append([attr, list(args)])
+            return method(*args)
+        return recorded
+
+    def init(self):
+        """Re-initialise the display and start a new frame."""
+        self._ops = []
+        self._display.init()
+
+    def begin_frame(self):
+        """Start recording a new frame without touching the display."""
+        self._ops = []
+
+    @property
+    def raw(self):
+        """The wrapped display, for drawing that shouldn't be recorded."""
+        return self._display
+
+    def note(self, attr, *args):
+        """Record a text or fill call without making it, for widgets that only draw what
+        changed but should be repainted whole."""
+        self._ops.append([attr, list(args)])
+
+    def note_bitmap(self, filename, x, y):
+        """Record that bitmap ``filename`` was drawn at ``x``, ``y``."""
+        self._ops.append(["bitmap", [filename, x, y]])
+
+    def save(self):
+        """Write the frame to the filesystem, if it changed since the last save."""
+        if self._ops == self._saved:
+            return
+        try:
+            with open(self._filename, "w") as file:
+                file.write(json.dumps(self._ops))
+            self._saved = list(self._ops)
+        except OSError as error:
+            print("Could not save frame:", error)
+
+    def replay(self, draw_bitmap):
+        """Repaint the saved frame, returns ``False`` if there is none.
+
+        :param draw_bitmap: Called as ``draw_bitmap(filename, x, y)`` for recorded bitmaps.
+
+        """
+        try:
+            with open(self._filename, "r") as file:
+                ops = json.loads(file.read())
+        except (OSError, ValueError):
+            return False
+        for attr, args in ops:
+            if attr == "bitmap":
+                draw_bitmap(*args)
+            else:
+                getattr(self._display, attr)(*args)
+        self._ops = ops
+        self._saved = list(ops)
+        return True
@@ -0,0 +1,191 @@
+"""
+`font_cache`
+================================================================================
+
+Shared font registry and precompiled binary fonts.
+
+``load_font()`` hands out one font object per path, so front-ends that ask for
+the same BDF file share it, and only loads glyphs that haven't been loaded yet.
+If a compiled ``.bcf`` file sits next to the ``.bdf``, it is used instead: it
+holds just the glyphs needed, already converted to bitmaps, and loads with a
+single read.
+
+Compile a font on the host computer with::
+
+    python font_cache.py fonts/Arial-16.bdf fonts/Arial-16.bcf "0123456789:. AMP"
+
+The ``.bcf`` format is little endian: ``b"BCF1"``, glyph count (H), font
+bounding box width, height, x, y (4h), then per glyph the code point (I),
+width, height (2B), dx, dy, shift_x, shift_y (4b) and bitmap offset (I), then
+the bitmaps, one bit per pixel, rows padded to whole bytes.
+
+* Author(s): SmartMirror+ team
+"""
+
+import os
+import struct
+
+MAGIC = b"BCF1"
+_HEADER = "<4sHhhhh"
+_GLYPH = "<IBBbbbbI"
+
+try:
+    from fontio import Glyph
+except ImportError:
+    from collections import namedtuple
+    Glyph = namedtuple("Glyph", ["bitmap", "tile_index", "width", "height", "dx", "dy",
+                                 "shift_x", "shift_y"])
+
+_fonts = {}
+_glyphs = {}
+
+
+class BinaryFont:
+    """A font loaded from a compiled ``.bcf`` file. Glyph bitmaps are built on first use.
+
+    :param str filename: The ``.bcf`` file to load.
+
+    """
+    def __init__(self, filename):
+        with open(filename, "rb") as file:
+            self._data = file.read()
+        magic, count, width, height, x, y = struct.unpack_from(_HEADER, self._data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a compiled font: " + filename)
+        self._bounding_box = (width, height, x, y)
+        self._index = {}
+        offset = struct.calcsize(_HEADER)
+        size = struct.calcsize(_GLYPH)
+        for _ in range(count):
+            self._index[struct.unpack_from("<I", self._data, offset)[0]] = offset
+            offset += size
+        self._bitmaps = offset
+        self._cache = {}
+
+    def get_bounding_box(self):
+        """The font bounding box as ``(width, height, x, y)``."""
+        return self._bounding_box
+
+    def load_glyphs(self, code_points):
+        """All compiled glyphs are already available, nothing to load."""
+
+    def get_glyph(self, code_point):
+        """The ``Glyph`` for ``code_point``, or ``None`` if it wasn't compiled in."""
+        glyph = self._cache.get(code_point)
+        if glyph is not None:
+            return glyph
+        offset = self._index.get(code_point)
+        if offset is None:
+            return None
+        import displayio
+        (_, width, height, dx, dy, shift_x, shift_y,
+         start) = struct.unpack_from(_GLYPH, self._data, offset)
+        bitmap = displayio.Bitmap(max(width, 1), max(height, 1), 2)
+        row_bytes = (width + 7) // 8
+        start += self._bitmaps
+        for y in range(height):
+            for x in range(width):
+                if self._data[start + x // 8] & (0x80 >> (x % 8)):
+                    bitmap[x, y] = 1
+            start += row_bytes
+        glyph = self._cache[code_point] = Glyph(bitmap, 0, width, height, dx, dy,
+                                                shift_x, shift_y)
+        return glyph
+
+
+def load_font(path, glyphs=None):
+    """The font at ``path``, loaded once and shared by everyone who asks for it.
+
+    :param str path: The ``.bdf`` font file. A ``.bcf`` file next to it is used if present.
+    :param glyphs: Glyphs to make sure are loaded, as ``bytes`` or ``str``.
+
+    """
+    font = _fonts.get(path)
+    if font is None:
+        compiled = path.rsplit('.', 1)[0] + ".bcf"
+        try:
+            os.stat(compiled)
+            font = BinaryFont(compiled)
+        except OSError:
+            from adafruit_bitmap_font import bitmap_font
+            font = bitmap_font.load_font(path)
+        _fonts[path] = font
+        _glyphs[path] = set()
+    if glyphs:
+        loaded = _glyphs[path]
+        wanted = ""
+        for char in glyphs:
+            if isinstance(char, int):
+                char = chr(char)
+            if char not in loaded and char not in wanted:
+                wanted += char
+        if wanted:
+            font.load_glyphs(wanted)
+            for char in wanted:
+                loaded.add(char)
+    return font
+
+
+def _parse_bdf(filename, wanted):
+    """Read the font bounding box and the ``wanted`` glyphs out of a BDF file."""
+    bounding_box = (0, 0, 0, 0)
+    glyphs = []
+    glyph = None
+    rows = None
+    with open(filename, "r") as file:
+        for line in file:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "FONTBOUNDINGBOX":
+                bounding_box = tuple(int(x) for x in parts[1:5])
+            elif parts[0] == "STARTCHAR":
+                glyph = {}
+            elif parts[0] == "ENCODING":
+                glyph["code_point"] = int(parts[1])
+            elif parts[0] == "DWIDTH":
+                glyph["shift_x"], glyph["shift_y"] = int(parts[1]), int(parts[2])
+            elif parts[0] == "BBX":
+                glyph["width"], glyph["height"], glyph["dx"], glyph["dy"] = (
+                    int(x) for x in parts[1:5])
+            elif parts[0] == "BITMAP":
+                rows = []
+            elif parts[0] == "ENDCHAR":
+                if glyph.get("code_point") in wanted:
+                    row_bytes = (glyph["width"] + 7) // 8
+                    data = b""
+                    for row in rows:
+                        value = int(row, 16) >> (len(row) * 4 - row_bytes * 8)
+                        data += value.to_bytes(row_bytes, "big")
+                    glyph["bitmap"] = data
+                    glyphs.append(glyph)
+                glyph = None
+                rows = None
+            elif rows is not None:
+                rows.append(parts[0])
+    return bounding_box, glyphs
+
+
+def compile_bdf(bdf_filename, bcf_filename, glyphs):
+    """Compile the ``glyphs`` (a ``str``) of a BDF font into a ``.bcf`` file. Runs on the host."""
+    bounding_box, parsed = _parse_bdf(bdf_filename, set(ord(c) for c in glyphs))
+    header = struct.pack(_HEADER, MAGIC, len(parsed), *bounding_box)
+    table = b""
+    bitmaps = b""
+    for glyph in parsed:
+        table += struct.pack(_GLYPH, glyph["code_point"], glyph["width"], glyph["height"],
+                             glyph["dx"], glyph["dy"], glyph["shift_x"], glyph["shift_y"],
+                             len(bitmaps))
+        bitmaps += glyph["bitmap"]
+    with open(bcf_filename, "wb") as file:
+        file.write(header + table + bitmaps)
+    print("Compiled %d glyphs into %s (%d bytes)" % (len(parsed), bcf_filename,
+                                                      len(header + table + bitmaps)))
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 4:
+        print("usage: python font_cache.py font.bdf font.bcf glyphs")
+        sys.exit(1)
+    compile_bdf(sys.argv[1], sys.argv[2], sys.argv[3])
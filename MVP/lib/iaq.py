@@ -0,0 +1,136 @@
+"""
+`iaq`
+================================================================================
+
+Indoor air quality score from BME680 gas resistance and humidity.
+
+The gas baseline is the resistance of clean air, which drifts with the sensor
+and the seasons. It is tracked with an exponential moving average that rises
+quickly towards higher (cleaner) readings and sinks slowly towards lower ones,
+so it is O(1) per sample in fixed memory. The score combines how far the gas
+resistance is below the baseline with how far humidity is from a comfortable
+40%, weighted 75/25.
+
+The baseline is saved to a file every ``save_interval`` seconds and loaded at
+start up, so a reboot doesn't need another burn-in.
+
+* Author(s): SmartMirror+ team
+"""
+
+import time
+import json
+
+HUMIDITY_BASELINE = 40.0  # %RH
+HUMIDITY_WEIGHT = 0.25
+
+RATINGS = ((90, "Excellent"), (75, "Good"), (60, "Fair"), (40, "Poor"), (0, "Bad"))
+
+
+def rating(score):
+    """A word for an air quality score."""
+    for threshold, word in RATINGS:
+        if score >= threshold:
+            return word
+    return RATINGS[-1][1]
+
+
+class AirQuality:
+    """Rolling gas baseline and IAQ score.
+
+    :param str filename: Where the baseline is kept, e.g. ``"/sd/iaq_baseline.json"``.
+                         ``None`` to not keep it.
+    :param int burn_in: Seconds of readings before the score is trusted, unless a saved
+                        baseline was loaded.
+    :param float rise_time: Time constant, in seconds, for the baseline to follow cleaner air.
+    :param float fall_time: Time constant, in seconds, for the baseline to follow dirtier air.
+    :param int save_interval: Seconds between baseline saves.
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, filename=None, *, burn_in=300, rise_time=60, fall_time=86400,
+                 save_interval=3600):
+        self._filename = filename
+        self.burn_in = burn_in
+        self.rise_time = rise_time
+        self.fall_time = fall_time
+        self.save_interval = save_interval
+        self.baseline = None
+        self.score = None
+        self._warm = 0           # seconds of readings seen
+        self._last = None        # time.monotonic() of the last update
+        self._saved = time.monotonic()
+        self.load()
+
+    @property
+    def ready(self):
+        """Whether the baseline has settled, so ``score`` means something."""
+        return self.baseline is not None and self._warm >= self.burn_in
+
+    @property
+    def iaq(self):
+        """The score on the 0 (good) to 500 (bad) IAQ scale, ``None`` if not ready."""
+        if not self.ready:
+            return None
+        return int((100 - self.score) * 5)
+
+    def update(self, gas, humidity):
+        """Add a reading and return the score (0 bad to 100 good), ``None`` while burning in.
+
+        :param float gas: Gas resistance in ohms.
+        :param float humidity: Relative humidity in %.
+
+        """
+        now = time.monotonic()
+        step = 0 if self._last is None else now - self._last
+        self._last = now
+        self._warm += step
+        if self.baseline is None:
+            self.baseline = gas
+        elif self._warm < self.burn_in:
+            # still burning in, follow the readings closely either way
+            self.baseline += (gas - self.baseline) * step / (self.rise_time + step)
+        else:
+            tau = self.rise_time if gas > self.baseline else self.fall_time
+            self.baseline += (gas - self.baseline) * step / (tau + step)
+
+        offset = humidity - HUMIDITY_BASELINE
+        if offset > 0:
+            humidity_score = (100 - HUMIDITY_BASELINE - offset) / (100 - HUMIDITY_BASELINE)
+        else:
+            humidity_score = (HUMIDITY_BASELINE + offset) / HUMIDITY_BASELINE
+        humidity_score = max(0, humidity_score) * HUMIDITY_WEIGHT * 100
+        gas_score = min(1, gas / self.baseline) * (1 - HUMIDITY_WEIGHT) * 100
+        self.score = humidity_score + gas_score
+
+        if now - self._saved >= self.save_interval:
+            self.save()
+        return self.score if self.ready else None
+
+    def load(self):
+        """Load a saved baseline, returns ``True`` if there was one."""
+        if not self._filename:
+            return False
+        try:
+            with open(self._filename, "r") as file:
+                saved = json.loads(file.read())
+            self.restore(float(saved['gas']))
+        except (OSError, ValueError, KeyError):
+            return False
+        print("Loaded gas baseline: %d ohm" % self.baseline)
+        return True
+
+    def restore(self, baseline):
+        """Carry on from a settled baseline, skipping the burn-in."""
+        self.baseline = baseline
+        self._warm = self.burn_in
+
+    def save(self):
+        """Save the baseline once it has settled."""
+        self._saved = time.monotonic()
+        if not self._filename or not self.ready:
+            return
+        try:
+            with open(self._filename, "w") as file:
+                file.write(json.dumps({'gas': self.baseline}))
+        except OSError as error:
+            print("Could not save gas baseline:", error)
@@ -0,0 +1,101 @@
+"""
+`icon_pool`
+================================================================================
+
+Icon sprites shared by the PyPortal front-ends.
+
+Opening a BMP and building its ``OnDiskBitmap`` and ``TileGrid`` costs a file
+open and a header parse every time an icon changes. ``IconPool`` keeps the last
+few sprites open, keyed by path, so switching back to one is just swapping the
+sprite in the icon group. After each change the likely next icon (the
+day/night variant of an OpenWeather icon, e.g. ``10d`` and ``10n``) is loaded
+ahead of time.
+
+* Author(s): SmartMirror+ team
+"""
+
+import displayio
+
+
+class IconPool:
+    """A bounded, least-recently-used pool of icon sprites shown in ``group``.
+
+    :param group: The ``displayio.Group`` the visible icon goes in. Must hold at least one item.
+    :param int size: The most icons to keep open, the visible one included.
+
+    """
+    def __init__(self, group, size=3):
+        self._group = group
+        self._size = max(size, 1)
+        self._pool = []  # [path, file, sprite], most recently used last
+        self.current = None
+        self.hits = 0
+        self.misses = 0
+
+    def _find(self, path):
+        for entry in self._pool:
+            if entry[0] == path:
+                return entry
+        return None
+
+    @staticmethod
+    def _load(path):
+        file = open(path, "rb")
+        icon = displayio.OnDiskBitmap(file)
+        try:
+            sprite = displayio.TileGrid(icon, pixel_shader=displayio.ColorConverter())
+        except TypeError:
+            sprite = displayio.TileGrid(icon, pixel_shader=displayio.ColorConverter(),
+                                        position=(0, 0))
+        return [path, file, sprite]
+
+    def _get(self, path):
+        entry = self._find(path)
+        if entry is not None:
+            self.hits += 1
+            self._pool.remove(entry)
+            self._pool.append(entry)
+            return entry
+        self.misses += 1
+        entry = self._load(path)
+        self._pool.append(entry)
+        while len(self._pool) > self._size:
+            for old in self._pool:
+                if old[0] != self.current and old is not entry:
+                    self._pool.remove(old)
+                    old[1].close()
+                    break
+            else:
+                break
+        return entry
+
+    def show(self, path):
+        """Make the icon at ``path`` the visible one. ``None`` removes the icon."""
+        if path == self.current:
+            return
+        sprite = self._get(path)[2] if path else None
+        if self._group:
+            self._group.pop()
+        if sprite is not None:
+            self._group.append(sprite)
+        self.current = path
+
+    def preload(self, path):
+        """Load the icon at ``path`` into the pool without showing it, if it exists."""
+        if not path or self._find(path) is not None:
+            return
+        try:
+            self._get(path)
+        except OSError:
+            pass  # no such icon, nothing to preload
+
+    @staticmethod
+    def variant(path):
+        """The day/night counterpart of an OpenWeather icon path, e.g. ``10d.bmp`` and
+        ``10n.bmp``, or ``None`` if ``path`` isn't one."""
+        if not path:
+            return None
+        base, dot, extension = path.rpartition('.')
+        if not dot or len(base) < 2 or base[-1] not in "dn" or not base[-2].isdigit():
+            return None
+        return base[:-1] + ("n" if base[-1] == "d" else "d") + dot + extension
@@ -0,0 +1,122 @@
+"""
+`image_cache`
+================================================================================
+
+Disk cache for converted images.
+
+Entries are keyed by source URL, resize and colour depth, stored as
+``<directory>/<key>.bmp`` and listed in a JSON manifest with their size and a
+use counter. When the cache grows past its quota the least recently used
+entries are deleted. The manifest is written when entries are added or
+evicted; use counts from lookups are only written every ``SAVE_INTERVAL``
+seconds, to spare the SD card.
+
+* Author(s): SmartMirror+ team
+"""
+
+import os
+import time
+import json
+
+MANIFEST = "manifest.json"
+SAVE_INTERVAL = 300  # seconds between manifest writes for use counts alone
+
+
+def cache_key(url, width, height, color_depth=16):
+    """32-bit FNV-1a hash of the source URL and conversion settings, as 8 hex digits."""
+    digest = 0x811C9DC5
+    for byte in ("%s|%d|%d|%d" % (url, width, height, color_depth)).encode('utf-8'):
+        digest = ((digest ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return "%08x" % digest
+
+
+class ImageCache:
+    """A size-bounded, least-recently-used cache of image files.
+
+    :param str directory: Where the images and manifest live, e.g. ``"/sd/imgcache"``.
+    :param int quota: The most bytes of images to keep. Defaults to 1MB.
+
+    """
+    def __init__(self, directory, quota=1024*1024):
+        self._directory = directory
+        self._quota = quota
+        self._manifest = directory + "/" + MANIFEST
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass # already there
+        try:
+            with open(self._manifest, "r") as file:
+                self._entries = json.loads(file.read())
+        except (OSError, ValueError):
+            self._entries = {}
+        self._clock = 0
+        self._dirty = False
+        self._saved = time.monotonic()
+        for key in self._entries:
+            self._clock = max(self._clock, self._entries[key]['used'])
+
+    def filename(self, key):
+        """The path an entry is stored at."""
+        return "%s/%s.bmp" % (self._directory, key)
+
+    def lookup(self, key, url):
+        """Return the path of the cached entry for ``url`` and mark it used, or ``None`` if
+        not cached."""
+        entry = self._entries.get(key)
+        if entry is None or entry['url'] != url:
+            return None  # not cached, or another image whose key collides
+        filename = self.filename(key)
+        try:
+            if os.stat(filename)[6] != entry['size']:
+                raise OSError("size mismatch")
+        except OSError:
+            # the file went missing or was cut short, forget about it
+            del self._entries[key]
+            self._save()
+            return None
+        self._clock += 1
+        entry['used'] = self._clock
+        self._dirty = True
+        if time.monotonic() - self._saved >= SAVE_INTERVAL:
+            self._save()
+        return filename
+
+    def add(self, key, url):
+        """Record the file just downloaded to ``filename(key)``, then evict down to quota."""
+        self._clock += 1
+        self._entries[key] = {'url': url, 'size': os.stat(self.filename(key))[6],
+                              'used': self._clock}
+        self._evict(key)
+        self._save()
+
+    def _evict(self, keep):
+        total = 0
+        for key in self._entries:
+            total += self._entries[key]['size']
+        while total > self._quota and len(self._entries) > 1:
+            oldest = None
+            for key in self._entries:
+                if key != keep and (oldest is None or
+                                    self._entries[key]['used'] < self._entries[oldest]['used']):
+                    oldest = key
+            total -= self._entries.pop(oldest)['size']
+            try:
+                os.remove(self.filename(oldest))
+            except OSError:
+                pass
+            print("Evicted cached image", oldest)
+
+    def flush(self):
+        """Write use counts that haven't been saved yet."""
+        if self._dirty:
+            self._save()
+
+    def _save(self):
+        self._saved = time.monotonic()
+        self._dirty = False
+        try:
+            with open(self._manifest, "w") as file:
+                file.write(json.dumps(self._entries))
+        except OSError as error:
+            print("Could not save image cache manifest:", error)
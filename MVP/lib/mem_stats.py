@@ -0,0 +1,199 @@
+"""
+`mem_stats`
+================================================================================
+
+Heap and garbage collector telemetry.
+
+Records free heap (and, when asked, the largest allocatable block) before and
+after each named stage, counts and times ``gc.collect()`` calls made through
+``collect()``, and flags a fragmentation trend when the largest free block
+keeps shrinking relative to the free total. On CPython, ``tracemalloc`` is
+used to report the lines that allocated the most in each frame.
+
+Typical use::
+
+    from mem_stats import MEM
+    MEM.enabled = True
+
+    MEM.begin("json")
+    json_out = r.json()
+    MEM.end("json")
+
+    MEM.collect()       # instead of gc.collect(), so collections are counted
+    MEM.report()
+
+``PyPortal.fetch()`` is bracketed with ``begin_frame()`` and ``end_frame()``, so
+setting ``MEM.enabled`` before fetching is all it takes to get the per-frame
+allocation report on CPython.
+
+* Author(s): SmartMirror+ team
+"""
+
+import gc
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+TREND_WINDOW = 8    # samples of fragmentation kept to spot a trend
+
+
+def mem_free():
+    """Free heap in bytes, or ``0`` where the port does not report it."""
+    try:
+        return gc.mem_free()  # pylint: disable=no-member
+    except AttributeError:
+        return 0
+
+
+def largest_free_block(limit=None):
+    """Size of the largest single allocation that currently succeeds.
+
+    Found by bisecting ``bytearray`` allocations, so it costs a handful of
+    allocations and should only be sampled when needed.
+
+    :param int limit: Upper bound for the search. Defaults to ``mem_free()``.
+
+    """
+    high = limit or mem_free()
+    low = 0
+    while low < high:
+        size = (low + high + 1) // 2
+        try:
+            block = bytearray(size)
+            block = None
+            low = size
+        except MemoryError:
+            high = size - 1
+    return low
+
+
+class MemStage:
+    """Heap figures of one stage: last delta and the worst (largest) drop seen."""
+    def __init__(self):
+        self.count = 0
+        self.free_before = 0
+        self.free_after = 0
+        self.worst_drop = 0
+
+    @property
+    def drop(self):
+        """Bytes the last run of the stage left allocated."""
+        return self.free_before - self.free_after
+
+
+class MemStats:
+    """Collects heap telemetry per named stage.
+
+    :param bool enabled: Whether anything is recorded. Defaults to ``False``.
+    :param bool probe_largest: Also sample the largest free block at every ``end()``. This
+                               costs a few allocations per sample. Defaults to ``False``.
+
+    """
+    def __init__(self, enabled=False, probe_largest=False):
+        self.enabled = enabled
+        self.probe_largest = probe_largest
+        self.stages = {}
+        self.collections = 0
+        self.collect_time = 0       # microseconds
+        self.collect_worst = 0      # microseconds
+        self._fragmentation = []
+        self._snapshot = None
+
+    def begin(self, name):
+        """Mark the start of stage ``name``."""
+        if not self.enabled:
+            return
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = MemStage()
+        stage.free_before = mem_free()
+
+    def end(self, name):
+        """Mark the end of stage ``name``, started with ``begin()``."""
+        if not self.enabled:
+            return
+        stage = self.stages.get(name)
+        if stage is None:
+            return
+        stage.free_after = mem_free()
+        stage.count += 1
+        if stage.drop > stage.worst_drop:
+            stage.worst_drop = stage.drop
+        if self.probe_largest:
+            self.sample_fragmentation()
+
+    def collect(self):
+        """Run ``gc.collect()``, counting and timing it while enabled."""
+        if not self.enabled:
+            gc.collect()
+            return
+        stamp = time.monotonic_ns()
+        gc.collect()
+        micros = (time.monotonic_ns() - stamp) // 1000
+        self.collections += 1
+        self.collect_time += micros
+        if micros > self.collect_worst:
+            self.collect_worst = micros
+
+    def sample_fragmentation(self):
+        """Record the ratio of largest free block to total free heap, in percent."""
+        free = mem_free()
+        if not free:
+            return 0
+        percent = largest_free_block(free) * 100 // free
+        self._fragmentation.append(percent)
+        if len(self._fragmentation) > TREND_WINDOW:
+            self._fragmentation.pop(0)
+        return percent
+
+    @property
+    def fragmenting(self):
+        """``True`` when the largest block has shrunk, relative to free heap, across the
+        whole trend window."""
+        samples = self._fragmentation
+        if len(samples) < TREND_WINDOW:
+            return False
+        for i in range(1, len(samples)):
+            if samples[i] > samples[i - 1]:
+                return False
+        return samples[-1] < samples[0]
+
+    def begin_frame(self):
+        """Start tracing allocations for one loop iteration (CPython only)."""
+        if not self.enabled or tracemalloc is None:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._snapshot = tracemalloc.take_snapshot()
+
+    def end_frame(self, top=10):
+        """Print the ``top`` lines that allocated the most since ``begin_frame()`` (CPython only)."""
+        if not self.enabled or self._snapshot is None:
+            return
+        stats = tracemalloc.take_snapshot().compare_to(self._snapshot, 'lineno')
+        self._snapshot = None
+        print("Top allocating lines:")
+        for stat in stats[:top]:
+            print("  ", stat)
+
+    def report(self):
+        """Print per-stage heap figures and collector totals over serial."""
+        print("Free mem:", mem_free())
+        print("%-10s %6s %8s %8s %8s" % ("stage", "count", "before", "after", "worst"))
+        for name in sorted(self.stages):
+            stage = self.stages[name]
+            print("%-10s %6d %8d %8d %8d" % (name, stage.count, stage.free_before,
+                                             stage.free_after, stage.worst_drop))
+        if self.collections:
+            print("gc.collect: %d calls, %0.1f ms mean, %0.1f ms worst" %
+                  (self.collections, self.collect_time / self.collections / 1000,
+                   self.collect_worst / 1000))
+        if self._fragmentation:
+            print("Largest block: %d%% of free heap%s" %
+                  (self._fragmentation[-1], " (fragmenting!)" if self.fragmenting else ""))
+
+
+MEM = MemStats()
@@ -0,0 +1,181 @@
+"""
+`perf_stats`
+================================================================================
+
+Lightweight per-stage latency instrumentation.
+
+Stages are timed with ``time.monotonic_ns()`` spans and kept in a small rolling
+window per stage, so a loop iteration can be broken down into Wi-Fi, HTTP, JSON,
+sensor, SD and drawing time. When ``enabled`` is ``False`` a span costs one
+attribute check and nothing is allocated.
+
+Typical use::
+
+    from perf_stats import PERF
+    PERF.enabled = True
+
+    stamp = PERF.start()
+    r = requests.get(url)
+    PERF.stop("http", stamp)
+
+    with PERF.span("draw"):
+        redraw()
+
+    PERF.report()
+
+* Author(s): SmartMirror+ team
+"""
+
+import time
+from array import array
+
+WINDOW = 32   # samples kept per stage
+
+
+class _NullSpan:
+    """Shared do-nothing context manager handed out while disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, stats, name):
+        self._stats = stats
+        self._name = name
+        self._stamp = 0
+
+    def __enter__(self):
+        self._stamp = time.monotonic_ns()
+        return self
+
+    def __exit__(self, *args):
+        self._stats.stop(self._name, self._stamp)
+        return False
+
+
+class Stage:
+    """Rolling window of the latest samples of one stage, in microseconds."""
+    def __init__(self, window=WINDOW):
+        self.samples = array('L', [0] * window)
+        self.count = 0
+        self.total = 0
+        self.worst = 0
+
+    def add(self, micros):
+        """Record one sample."""
+        self.samples[self.count % len(self.samples)] = micros
+        self.count += 1
+        self.total += micros
+        if micros > self.worst:
+            self.worst = micros
+
+    def window(self):
+        """Sorted list of the samples currently in the window."""
+        return sorted(self.samples[:min(self.count, len(self.samples))])
+
+    def summary(self):
+        """``(count, mean, p50, p95, max)`` over the window, in microseconds."""
+        samples = self.window()
+        if not samples:
+            return (0, 0, 0, 0, 0)
+        num = len(samples)
+        return (self.count, sum(samples) // num, samples[num // 2],
+                samples[min(num - 1, (num * 95) // 100)], samples[-1])
+
+
+class PerfStats:
+    """Collects spans per named stage.
+
+    :param bool enabled: Whether spans are recorded. Defaults to ``False``.
+    :param int window: How many recent samples to keep per stage.
+
+    """
+    def __init__(self, enabled=False, window=WINDOW):
+        self.enabled = enabled
+        self._window = window
+        self.stages = {}
+
+    def start(self):
+        """Return a timestamp to pass to ``stop()``, or ``0`` while disabled."""
+        if self.enabled:
+            return time.monotonic_ns()
+        return 0
+
+    def stop(self, name, stamp):
+        """Record the time elapsed since ``stamp`` under stage ``name``."""
+        if stamp:
+            self.add(name, (time.monotonic_ns() - stamp) // 1000)
+
+    def since(self, stamp):
+        """Microseconds elapsed since ``stamp``, ``0`` while disabled. For summing
+        many short spans into one sample with ``add()``."""
+        if not stamp:
+            return 0
+        return (time.monotonic_ns() - stamp) // 1000
+
+    def add(self, name, micros):
+        """Record an already measured sample of ``micros`` under stage ``name``."""
+        if not self.enabled:
+            return
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(self._window)
+        stage.add(micros)
+
+    def span(self, name):
+        """A context manager timing its block under stage ``name``."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def reset(self):
+        """Forget every recorded sample."""
+        self.stages = {}
+
+    def report(self):
+        """Print a table of every stage over serial, times in milliseconds."""
+        print("%-10s %6s %8s %8s %8s %8s" % ("stage", "count", "mean", "p50", "p95", "max"))
+        for name in sorted(self.stages):
+            count, mean, p50, p95, worst = self.stages[name].summary()
+            print("%-10s %6d %8.1f %8.1f %8.1f %8.1f" % (name, count, mean / 1000, p50 / 1000,
+                                                         p95 / 1000, worst / 1000))
+
+    def draw_overlay(self, display, x=0, y=0, color=0xFFFF):
+        """Draw the mean time of every stage as a small text block on an RA8875 display.
+
+        :param display: The ``adafruit_ra8875`` display to draw on.
+        :param x: The x position of the upper left corner of the overlay.
+        :param y: The y position of the upper left corner of the overlay.
+        :param color: The RGB565 text color.
+
+        """
+        display.txt_trans(color)
+        display.txt_size(0)
+        for name in sorted(self.stages):
+            mean = self.stages[name].summary()[1]
+            display.txt_set_cursor(x, y)
+            display.txt_write("%-8s%7.1fms" % (name, mean / 1000))
+            y += 16
+
+    def push_to_io(self, io_client, prefix="perf"):
+        """Send the mean time of every stage, in milliseconds, to Adafruit IO.
+
+        Each stage goes to the feed ``<prefix>-<stage>``, so a fleet of mirrors can share a
+        dashboard by giving each one its own prefix.
+
+        :param io_client: An ``IO_HTTP`` client.
+        :param str prefix: The feed key prefix.
+
+        """
+        for name in self.stages:
+            mean = self.stages[name].summary()[1]
+            io_client.send_data(prefix + "-" + name, round(mean / 1000, 1))
+
+
+PERF = PerfStats()
@@ -0,0 +1,189 @@
+"""
+`power`
+================================================================================
+
+Sleep between scheduled updates instead of idling at full power.
+
+``PowerScheduler`` runs tasks at fixed intervals. In between, it works out
+when the next one is due, holds the ESP32 in reset while no network task is
+coming up soon, and light sleeps with CircuitPython's ``alarm`` module until
+then, or until a wake pin (a button, the APDS9960 interrupt) goes low. On
+CircuitPython builds without ``alarm`` it falls back to ``time.sleep()``.
+
+Light sleep keeps everything in RAM. For deep sleep, which restarts the
+program, ``state`` is kept in ``alarm.sleep_memory`` and loaded back on wake.
+
+Typical use::
+
+    scheduler = PowerScheduler(radio_reset=esp32_reset, reconnect=connect_wifi,
+                               wake_pins=(board.D59,))
+    scheduler.add("weather", 600, fetch_weather, network=True)
+    scheduler.add("page", 45, draw_page)
+    while True:
+        scheduler.run_due()
+        scheduler.sleep()
+
+* Author(s): SmartMirror+ team
+"""
+
+import time
+import json
+
+try:
+    import alarm
+except ImportError:
+    alarm = None
+
+
+class PowerScheduler:
+    """Interval tasks with light sleep and ESP32 power down in between.
+
+    :param radio_reset: The ``DigitalInOut`` on the ESP32 reset pin, ``None`` to leave the
+                        radio alone.
+    :param reconnect: Called with no arguments to bring Wi-Fi back after the radio was off.
+    :param wake_pins: Pins that wake the board when pulled low.
+    :param int radio_off_after: Only power the radio down if no network task is due for
+                                this many seconds, since reconnecting costs time and power too.
+
+    """
+    def __init__(self, *, radio_reset=None, reconnect=None, wake_pins=(), radio_off_after=60):
+        self._radio_reset = radio_reset
+        self._reconnect = reconnect
+        self._wake_pins = wake_pins
+        self.radio_off_after = radio_off_after
+        self.radio_on = True
+        self._tasks = []  # [name, interval, function, network, next due]
+        self.slept = 0
+        self.state = {}
+        if alarm and alarm.wake_alarm is not None:
+            self.load_state()
+
+    def add(self, name, interval, function, *, network=False):
+        """Run ``function()`` every ``interval`` seconds, the first time on the next ``run_due()``.
+
+        :param bool network: Whether the task needs Wi-Fi, so the radio is brought back first.
+
+        """
+        self._tasks.append([name, interval, function, network, 0])
+
+    def _task(self, name):
+        for task in self._tasks:
+            if task[0] == name:
+                return task
+        raise KeyError(name)
+
+    def trigger(self, name):
+        """Make a task due now."""
+        self._task(name)[4] = 0
+
+    def set_interval(self, name, interval):
+        """Change how often a task runs, from its last run."""
+        task = self._task(name)
+        if task[4]:
+            task[4] += interval - task[1]
+        task[1] = interval
+
+    def run_due(self):
+        """Run every task that is due, returns their names."""
+        ran = []
+        for task in self._tasks:
+            now = time.monotonic()
+            if now < task[4]:
+                continue
+            if task[3]:
+                self.wake_radio()
+            task[4] = now + task[1]
+            task[2]()
+            ran.append(task[0])
+        return ran
+
+    def next_due(self, network=None):
+        """Seconds until the next task is due, only counting network tasks if ``network``."""
+        now = time.monotonic()
+        soonest = None
+        for task in self._tasks:
+            if network and not task[3]:
+                continue
+            wait = max(0, task[4] - now)
+            if soonest is None or wait < soonest:
+                soonest = wait
+        return soonest
+
+    def sleep_radio(self):
+        """Hold the ESP32 in reset, its lowest power state."""
+        if self._radio_reset is None or not self.radio_on:
+            return
+        self._radio_reset.value = False
+        self.radio_on = False
+        print("Radio off")
+
+    def wake_radio(self):
+        """Release the ESP32 from reset and reconnect, if it was off."""
+        if self.radio_on:
+            return
+        self._radio_reset.value = True
+        self.radio_on = True
+        print("Radio on")
+        if self._reconnect:
+            self._reconnect()
+
+    def sleep(self):
+        """Sleep until the next task is due or a wake pin goes low.
+
+        :return: The pin that woke the board, or ``None`` if it was the timer.
+
+        """
+        wait = self.next_due()
+        if not wait:
+            return None
+        network_wait = self.next_due(network=True)
+        if network_wait is None or network_wait >= self.radio_off_after:
+            self.sleep_radio()
+        self.slept += wait
+        if alarm is None:
+            time.sleep(wait)
+            return None
+        alarms = [alarm.time.TimeAlarm(monotonic_time=time.monotonic() + wait)]
+        for pin in self._wake_pins:
+            alarms.append(alarm.pin.PinAlarm(pin=pin, value=False, pull=True))
+        woke = alarm.light_sleep_until_alarms(*alarms)
+        if isinstance(woke, alarm.pin.PinAlarm):
+            return woke.pin
+        return None
+
+    def deep_sleep(self):
+        """Save ``state`` and deep sleep until the next task is due or a wake pin goes low.
+        The program restarts on wake. Without ``alarm`` this is a light ``sleep()``."""
+        if alarm is None:
+            self.sleep()
+            return
+        self.sleep_radio()
+        self.save_state()
+        alarms = [alarm.time.TimeAlarm(monotonic_time=time.monotonic() + (self.next_due() or 0))]
+        for pin in self._wake_pins:
+            alarms.append(alarm.pin.PinAlarm(pin=pin, value=False, pull=True))
+        alarm.exit_and_deep_sleep_until_alarms(*alarms)
+
+    def save_state(self):
+        """Keep ``state`` in ``alarm.sleep_memory``, as a length prefixed JSON string."""
+        if alarm is None:
+            return False
+        data = json.dumps(self.state).encode('utf-8')
+        memory = alarm.sleep_memory
+        if len(data) + 2 > len(memory):
+            print("State too large for sleep memory:", len(data))
+            return False
+        memory[0] = len(data) >> 8
+        memory[1] = len(data) & 0xFF
+        memory[2:2 + len(data)] = data
+        return True
+
+    def load_state(self):
+        """Load ``state`` back from ``alarm.sleep_memory``."""
+        memory = alarm.sleep_memory
+        length = memory[0] << 8 | memory[1]
+        try:
+            self.state = json.loads(bytes(memory[2:2 + length]).decode('utf-8'))
+        except (ValueError, UnicodeError):
+            self.state = {}
+        return self.state
@@ -0,0 +1,107 @@
+"""
+`qr_render`
+================================================================================
+
+QR code rendering for both front-ends.
+
+The QR matrix is generated once per payload and kept as runs of dark modules per
+row, which both renderers work from. ``qr_bitmap()`` fills each run into a fresh
+(already zeroed) ``displayio.Bitmap`` for the PyPortal with a single
+``bitmaptools.fill_region`` call, or pixel by pixel on builds without
+``bitmaptools``. ``draw_ra8875()`` draws each run as a single scaled
+``fill_rect`` on the RA8875. The last few payloads are cached, so showing the
+same pairing code again is immediate.
+
+* Author(s): SmartMirror+ team
+"""
+
+try:
+    from bitmaptools import fill_region
+except ImportError:
+    fill_region = None
+
+CACHE_SIZE = 2
+
+_runs_cache = []    # (data, size, runs), most recent last
+_bitmap_cache = []  # (data, bitmap, palette), most recent last
+
+
+def _remember(cache, entry):
+    cache.append(entry)
+    if len(cache) > CACHE_SIZE:
+        cache.pop(0)
+
+
+def qr_runs(qr_data):
+    """The QR matrix for ``qr_data`` as ``(size, runs)``, where ``runs`` is a list of
+    ``(x, y, length)`` horizontal runs of dark modules."""
+    for entry in _runs_cache:
+        if entry[0] == qr_data:
+            return entry[1], entry[2]
+    import adafruit_miniqr
+    qrcode = adafruit_miniqr.QRCode()
+    qrcode.add_data(qr_data)
+    qrcode.make()
+    matrix = qrcode.matrix
+    runs = []
+    for y in range(matrix.height):
+        start = None
+        for x in range(matrix.width):
+            if matrix[x, y]:
+                if start is None:
+                    start = x
+            elif start is not None:
+                runs.append((start, y, x - start))
+                start = None
+        if start is not None:
+            runs.append((start, y, matrix.width - start))
+    _remember(_runs_cache, (qr_data, matrix.width, runs))
+    return matrix.width, runs
+
+
+def qr_bitmap(qr_data):
+    """A monochrome ``displayio.Bitmap`` of the QR code with a one module border, and its
+    ``Palette``, as ``(bitmap, palette)``."""
+    for entry in _bitmap_cache:
+        if entry[0] == qr_data:
+            return entry[1], entry[2]
+    import displayio
+    size, runs = qr_runs(qr_data)
+
+    # monochrome (2 color) palette
+    palette = displayio.Palette(2)
+    palette[0] = 0xFFFFFF
+    palette[1] = 0x000000
+
+    # bitmap the size of the matrix, plus border, monochrome (2 colors). A new
+    # bitmap is all zeros, so only the dark modules need setting.
+    bitmap = displayio.Bitmap(size + 2, size + 2, 2)
+    for x, y, length in runs:
+        if fill_region:
+            fill_region(bitmap, x + 1, y + 1, x + 1 + length, y + 2, 1)
+        else:
+            for i in range(x + 1, x + 1 + length):
+                bitmap[i, y + 1] = 1
+    _remember(_bitmap_cache, (qr_data, bitmap, palette))
+    return bitmap, palette
+
+
+# pylint: disable=too-many-arguments
+def draw_ra8875(display, qr_data, x=0, y=0, scale=4, color=0x0000, background=0xFFFF):
+    """Draw a QR code straight onto an RA8875 display with hardware rectangle fills.
+
+    :param display: The ``adafruit_ra8875`` display to draw on.
+    :param qr_data: The data for the QR code.
+    :param x: The x position of the upper left corner of the QR code, border included.
+    :param y: The y position of the upper left corner of the QR code, border included.
+    :param int scale: Pixels per QR module.
+    :param color: The RGB565 color of dark modules.
+    :param background: The RGB565 color of light modules and the border.
+
+    """
+    size, runs = qr_runs(qr_data)
+    display.fill_rect(x, y, (size + 2) * scale, (size + 2) * scale, background)
+    x += scale
+    y += scale
+    for run_x, run_y, length in runs:
+        display.fill_rect(x + run_x * scale, y + run_y * scale, length * scale, scale, color)
@@ -0,0 +1,159 @@
+"""
+`recovery`
+================================================================================
+
+Watchdog and state snapshots, so a crash or hang costs a restart and not the
+whole cold boot.
+
+The hardware watchdog resets the board if the main loop stops feeding it,
+e.g. when the ESP32 hangs the SPI bus. A small JSON snapshot of what the loop
+knows (last weather reply, time of day, sensor baselines, page shown) is saved
+now and then. After a restart, ``load()`` hands it back so the program can show
+data at once and fetch fresh data in the background.
+
+Snapshots go to the SD card and are written to a temporary file first, then
+renamed, so a reset mid-write never leaves a half written snapshot. If the SD
+card can't be written they go to ``microcontroller.nvm`` instead. Its flash
+wears out, so it is written at most every ``nvm_interval`` seconds, or when a
+save is forced, e.g. right before a restart.
+
+Typical use::
+
+    recovery = Recovery("/sd/state.json")
+    state = recovery.load()
+    recovery.start_watchdog(16)
+    while True:
+        recovery.feed()
+        ...
+        recovery.save({"page": page, ...})
+
+* Author(s): SmartMirror+ team
+"""
+
+import os
+import time
+import json
+
+try:
+    import microcontroller
+except ImportError:
+    microcontroller = None
+
+
+class Recovery:
+    """Watchdog handling and atomic state snapshots.
+
+    :param str filename: Where the snapshot is kept, e.g. ``"/sd/state.json"``.
+    :param bool use_nvm: Fall back to ``microcontroller.nvm`` if the file can't be written.
+    :param int nvm_interval: Least seconds between unforced writes to ``microcontroller.nvm``.
+
+    """
+    def __init__(self, filename, *, use_nvm=True, nvm_interval=3600):
+        self._filename = filename
+        self._temp = filename + ".tmp"
+        self._use_nvm = use_nvm and microcontroller is not None and microcontroller.nvm
+        self.nvm_interval = nvm_interval
+        self._saved = None      # the last snapshot written, as JSON
+        self._nvm_saved = None  # time.monotonic() of the last write to nvm
+        self.restored = False
+
+    def start_watchdog(self, timeout):
+        """Reset the board if ``feed()`` isn't called for ``timeout`` seconds."""
+        if microcontroller is None:
+            return
+        try:
+            from watchdog import WatchDogMode
+            watchdog = microcontroller.watchdog
+            watchdog.timeout = timeout
+            watchdog.mode = WatchDogMode.RESET
+            watchdog.feed()
+        except (ImportError, AttributeError, NotImplementedError, ValueError) as error:
+            print("No watchdog:", error)
+
+    def feed(self):
+        """Tell the watchdog the program is still running."""
+        if microcontroller is not None and microcontroller.watchdog.mode is not None:
+            microcontroller.watchdog.feed()
+
+    def stop_watchdog(self):
+        """Turn the watchdog off, e.g. before a long blocking operation."""
+        if microcontroller is not None and microcontroller.watchdog.mode is not None:
+            microcontroller.watchdog.deinit()
+
+    def save(self, state, *, force=False):
+        """Save ``state`` (a JSON serialisable dict), if it changed since the last save.
+
+        :param bool force: Write to ``microcontroller.nvm``, if it comes to that, even if it
+                           was written less than ``nvm_interval`` seconds ago.
+
+        """
+        data = json.dumps(state)
+        if data == self._saved:
+            return
+        try:
+            with open(self._temp, "w") as file:
+                file.write(data)
+            try:
+                os.remove(self._filename)
+            except OSError:
+                pass  # first snapshot
+            os.rename(self._temp, self._filename)
+        except OSError as error:
+            if not self._save_nvm(data, force):
+                print("Could not save state:", error)
+                return
+        self._saved = data
+
+    def _save_nvm(self, data, force):
+        if not self._use_nvm:
+            return False
+        now = time.monotonic()
+        if not force and self._nvm_saved is not None and now - self._nvm_saved < self.nvm_interval:
+            return False
+        data = data.encode('utf-8')
+        nvm = microcontroller.nvm
+        if len(data) + 2 > len(nvm):
+            print("State too large for nvm:", len(data))
+            return False
+        nvm[0:2 + len(data)] = bytes((len(data) >> 8, len(data) & 0xFF)) + data
+        self._nvm_saved = now
+        return True
+
+    def load(self):
+        """The last saved state, or an empty dict if there isn't one."""
+        for filename in (self._filename, self._temp):
+            try:
+                with open(filename, "r") as file:
+                    state = json.loads(file.read())
+                self.restored = True
+                return state
+            except (OSError, ValueError):
+                pass
+        if self._use_nvm:
+            nvm = microcontroller.nvm
+            length = nvm[0] << 8 | nvm[1]
+            try:
+                state = json.loads(bytes(nvm[2:2 + length]).decode('utf-8'))
+                if isinstance(state, dict):
+                    self.restored = True
+                    return state
+            except (ValueError, UnicodeError):
+                pass
+        return {}
+
+    @staticmethod
+    def reloaded():
+        """Whether this run was started by ``supervisor.reload()`` rather than a reset, so
+        ``time.monotonic()`` carried on from the last run."""
+        try:
+            import supervisor
+            return supervisor.runtime.run_reason in (supervisor.RunReason.SUPERVISOR_RELOAD,
+                                                     supervisor.RunReason.AUTO_RELOAD)
+        except (ImportError, AttributeError):
+            return False
+
+    @staticmethod
+    def restart():
+        """Restart the program, keeping the board and its USB connection up."""
+        import supervisor
+        supervisor.reload()
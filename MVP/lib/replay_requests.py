@@ -0,0 +1,251 @@
+"""
+`replay_requests`
+================================================================================
+
+Record/replay stand-in for the ESP32 ``requests`` module.
+
+Responses are stored as plain files on the filesystem and described by a JSON
+manifest that maps URL patterns to those files, along with the status code,
+headers and timing of the original response. ``ReplayRequests`` serves them back
+through the same ``get()``/``post()``/``iter_content()`` interface the network
+module provides, either at the originally recorded speed or faster, so
+``PyPortal.fetch()``/``wget()`` can be benchmarked and soak tested offline.
+
+A manifest looks like::
+
+    [{"pattern": "http://api.openweathermap.org/*", "file": "/sd/replay/weather.json",
+      "status": 200, "headers": {"content-type": "application/json"},
+      "first_byte": 0.412, "elapsed": 0.930}]
+
+``pattern`` may contain ``*`` wildcards, entries are matched in order.
+
+* Author(s): SmartMirror+ team
+"""
+
+import os
+import time
+import json
+
+MANIFEST = "replay.json"
+
+
+def _match(pattern, url):
+    """Glob style match of ``url`` against ``pattern``, ``*`` matches any run of characters."""
+    parts = pattern.split('*')
+    if len(parts) == 1:
+        return pattern == url
+    if not url.startswith(parts[0]) or not url.endswith(parts[-1]):
+        return False
+    pos = len(parts[0])
+    end = len(url) - len(parts[-1])
+    for part in parts[1:-1]:
+        pos = url.find(part, pos, end)
+        if pos < 0:
+            return False
+        pos += len(part)
+    return pos <= end
+
+
+class ReplayResponse:
+    """A recorded response read back from a file.
+
+    :param str filename: The file holding the response body.
+    :param int status_code: The recorded HTTP status.
+    :param dict headers: The recorded headers, ``content-length`` is filled in from the file.
+    :param float first_byte: Seconds the original response took to start arriving.
+    :param float elapsed: Seconds the original response took to arrive completely.
+    :param float speed: Replay speed factor, ``1`` is real time and ``0`` disables pacing.
+    :param int offset: Byte offset to start the body at, used to answer ``Range`` requests.
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, filename, status_code=200, headers=None, first_byte=0, elapsed=0,
+                 speed=1, offset=0):
+        self._filename = filename
+        self._offset = offset
+        self._speed = speed
+        self._size = os.stat(filename)[6]
+        self.status_code = status_code
+        self.reason = b"OK"
+        self.headers = {}
+        if headers:
+            for key in headers:
+                self.headers[key.lower()] = headers[key]
+        self.headers['content-length'] = str(self._size - offset)
+        # time per byte for the body, spread over every chunk we hand out
+        self._byte_time = 0
+        if speed and self._size:
+            self._byte_time = max(0, elapsed - first_byte) / self._size / speed
+            self._pace(first_byte / speed)
+        self._content = None
+
+    @staticmethod
+    def _pace(seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @property
+    def content(self):
+        """The whole body as bytes."""
+        if self._content is None:
+            with open(self._filename, "rb") as file:
+                file.seek(self._offset)
+                self._content = file.read()
+            self._pace(len(self._content) * self._byte_time)
+        return self._content
+
+    @property
+    def text(self):
+        """The whole body decoded as utf-8."""
+        return str(self.content, 'utf-8')
+
+    def json(self):
+        """json parsed version of the body."""
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        """Yield the body in chunks of ``chunk_size`` bytes, paced like the original."""
+        with open(self._filename, "rb") as file:
+            file.seek(self._offset)
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    return
+                self._pace(len(chunk) * self._byte_time)
+                if decode_unicode:
+                    chunk = str(chunk, 'utf-8')
+                yield chunk
+
+    def close(self):
+        """Release the response, nothing to do for a file."""
+        self._content = None
+
+
+class ReplayRequests:
+    """Drop-in replacement for the ``requests`` module that answers from recorded files.
+
+    :param routes: A list of manifest entries (dicts) to start with. Defaults to ``None``.
+    :param float speed: Replay speed factor. ``1`` reproduces the recorded timing, ``10`` is ten
+                        times faster and ``0`` replays as fast as the filesystem allows.
+
+    """
+    def __init__(self, routes=None, *, speed=1):
+        self.speed = speed
+        self._routes = []
+        if routes:
+            for route in routes:
+                self.add_route(**route)
+
+    @classmethod
+    def from_manifest(cls, filename=MANIFEST, *, speed=1):
+        """Build a replayer from a JSON manifest file."""
+        with open(filename, "r") as file:
+            return cls(json.load(file), speed=speed)
+
+    # pylint: disable=too-many-arguments
+    def add_route(self, pattern, file, status=200, headers=None, first_byte=0, elapsed=0):
+        """Serve ``file`` for every URL matching ``pattern``."""
+        self._routes.append({'pattern': pattern, 'file': file, 'status': status,
+                             'headers': headers or {}, 'first_byte': first_byte,
+                             'elapsed': elapsed})
+
+    def set_socket(self, *args):
+        """Accepted for interface compatibility, replay needs no socket."""
+
+    def set_interface(self, *args):
+        """Accepted for interface compatibility, replay needs no interface."""
+
+    def request(self, method, url, data=None, json=None, headers=None, stream=False, timeout=1):  # pylint: disable=unused-argument,redefined-outer-name
+        """Answer ``url`` from the first matching recording, raises ``OSError`` if there is none."""
+        for route in self._routes:
+            if _match(route['pattern'], url):
+                break
+        else:
+            raise OSError("No recorded response for " + url)
+        offset = 0
+        status = route['status']
+        if headers:
+            for key in headers:
+                if key.lower() == 'range':
+                    # only "bytes=N-" is ever sent by wget
+                    offset = int(headers[key].split('=')[1].split('-')[0])
+                    status = 206
+        return ReplayResponse(route['file'], status, route['headers'], route['first_byte'],
+                              route['elapsed'], self.speed, offset)
+
+    def head(self, url, **kw):
+        """Send HTTP HEAD request"""
+        return self.request("HEAD", url, **kw)
+
+    def get(self, url, **kw):
+        """Send HTTP GET request"""
+        return self.request("GET", url, **kw)
+
+    def post(self, url, **kw):
+        """Send HTTP POST request"""
+        return self.request("POST", url, **kw)
+
+    def put(self, url, **kw):
+        """Send HTTP PUT request"""
+        return self.request("PUT", url, **kw)
+
+    def patch(self, url, **kw):
+        """Send HTTP PATCH request"""
+        return self.request("PATCH", url, **kw)
+
+    def delete(self, url, **kw):
+        """Send HTTP DELETE request"""
+        return self.request("DELETE", url, **kw)
+
+
+class RecordingRequests(ReplayRequests):
+    """Pass requests through to a real ``requests`` module and record every response.
+
+    Each response body is saved into ``directory`` and the manifest is rewritten after
+    every request, so the recording can be replayed later with ``ReplayRequests``.
+
+    :param requests: The real ``requests`` module to record from.
+    :param str directory: Where to save the recorded bodies, e.g. ``"/sd/replay"``.
+    :param str manifest: The manifest filename. Defaults to ``directory + "/replay.json"``.
+
+    """
+    def __init__(self, requests, directory, manifest=None):
+        super().__init__(speed=0)
+        self._requests = requests
+        self._directory = directory
+        self._manifest = manifest or directory + "/" + MANIFEST
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass # already there
+
+    def set_socket(self, *args):
+        self._requests.set_socket(*args)
+
+    def set_interface(self, *args):
+        self._requests.set_interface(*args)
+
+    def request(self, method, url, data=None, json=None, headers=None, stream=False, timeout=1):  # pylint: disable=redefined-outer-name
+        stamp = time.monotonic()
+        response = self._requests.request(method, url, data=data, json=json, headers=headers,
+                                          stream=True, timeout=timeout)
+        first_byte = time.monotonic() - stamp
+        filename = "%s/%03d.bin" % (self._directory, len(self._routes))
+        with open(filename, "wb") as file:
+            for chunk in response.iter_content(512):
+                file.write(chunk)
+        elapsed = time.monotonic() - stamp
+        saved_headers = {}
+        for key in response.headers:
+            if key.lower() != 'content-length':
+                saved_headers[key] = response.headers[key]
+        self.add_route(url, filename, response.status_code, saved_headers,
+                       first_byte, elapsed)
+        response.close()
+        with open(self._manifest, "w") as file:
+            file.write(self._dumps())
+        print("Recorded %s in %0.3f seconds" % (url, elapsed))
+        return ReplayResponse(filename, response.status_code, saved_headers)
+
+    def _dumps(self):
+        return json.dumps(self._routes)
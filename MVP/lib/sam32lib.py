@@ -11,45 +11,34 @@ import busio, time
 import digitalio
 import storage, sys
 import analogio,microcontroller,supervisor
+import battery
 class DevBoard:
     def __init__(self):
         """
-        Big init routine as the whole board is brought up.
+        Only the pins that keep the bus quiet are set up here. SPI, UART, SD card,
+        NeoPixel, ESP32 and battery ADC each come up on first use of their property,
+        see ``init_time``/``init_error`` for how that went and ``reinit`` to retry one.
         """
         self.hardware = {
                        'SDcard':   False,
                        'ESP32':    False,
                        'Neopixel': False,
                        }
+        self.init_time = {}   # milliseconds each device took to come up
+        self.init_error = {}  # why a device failed to come up
+        self._devices = {}
+        self._battery = None
         self.payload=None
         self.filename=''
         # Define LEDs:
         self._led = digitalio.DigitalInOut(board.LED)
         self._led.switch_to_output()
 
-        # Define battery voltage
-        # self._vbatt = analogio.AnalogIn(board.BATTERY)
-
-        # Define SPI,I2C,UART
-        self._spi  = busio.SPI(board.SCK,MOSI=board.MOSI,MISO=board.MISO)
-        self._uart = busio.UART(board.TX2,board.RX2)
-
-        # Define sdcard
+        # Deselect sdcard so it stays off the SPI bus until mounted
         self._sdcs = digitalio.DigitalInOut(board.xSDCS)
         self._sdcs.direction = digitalio.Direction.OUTPUT
         self._sdcs.value = True
 
-        # Initialize sdcard
-        try:
-            import adafruit_sdcard
-            self._sd  = adafruit_sdcard.SDCard(self._spi, self._sdcs)
-            self._vfs = storage.VfsFat(self._sd)
-            storage.mount(self._vfs, "/sd")
-            sys.path.append("/sd")
-            self.hardware['SDcard'] = True
-        except Exception as e:
-            print('[WARNING]',e)
-
         # Define ESP32
         self._esp_dtr = digitalio.DigitalInOut(board.DTR)
         self._esp_rts = digitalio.DigitalInOut(board.RTS)
@@ -62,23 +51,122 @@ class DevBoard:
         self._esp_dtr.value = False
         self._esp_rts.value = False
 
-
-        # Initialize Neopixel
+    def _bring_up(self, name):
+        """Return the handle of device ``name``, initialising it on first use.
+        A device that failed stays ``None`` until ``reinit(name)``."""
+        if name in self._devices:
+            return self._devices[name]
+        if name in self.init_error:
+            return None
+        stamp = time.monotonic_ns()
         try:
-            self.neopixel = neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.2, pixel_order=neopixel.GRB)
-            self.neopixel[0] = (0,0,0)
-            self.hardware['Neopixel'] = True
+            device = getattr(self, '_init_' + name)()
+            self._devices[name] = device
+            if name in self.hardware:
+                self.hardware[name] = True
         except Exception as e:
-            print('[WARNING]',e)
-    def esp_init(self):
+            device = None
+            self.init_error[name] = str(e)
+            print('[WARNING]',name,e)
+        self.init_time[name] = (time.monotonic_ns() - stamp) // 1000000
+        return device
+
+    def reinit(self, name):
+        """Tear down device ``name`` (e.g. ``'SDcard'``) and bring it up again,
+        without touching the rest of the board. Reinitialising ``'SPI'`` also
+        brings the SD card and ESP32 back up on the new bus, if they were up."""
+        if name == 'SPI':
+            on_bus = [dev for dev in ('SDcard', 'ESP32') if dev in self._devices]
+            for dev in on_bus:
+                self._teardown(dev)
+            self._teardown('SPI')
+            spi = self._bring_up('SPI')
+            for dev in on_bus:
+                self._bring_up(dev)
+            return spi
+        self._teardown(name)
+        return self._bring_up(name)
+
+    def _teardown(self, name):
+        """Release device ``name`` so it can be brought up again."""
+        device = self._devices.pop(name, None)
+        self.init_error.pop(name, None)
+        if name in self.hardware:
+            self.hardware[name] = False
+        if device is not None:
+            try:
+                if name == 'SDcard':
+                    storage.umount("/sd")
+                elif hasattr(device, 'deinit'):
+                    device.deinit()
+            except Exception as e:
+                print('[WARNING]',e)
+
+    def _init_SPI(self):
+        return busio.SPI(board.SCK,MOSI=board.MOSI,MISO=board.MISO)
+
+    def _init_UART(self):
+        return busio.UART(board.TX2,board.RX2)
+
+    def _init_SDcard(self):
+        import adafruit_sdcard
+        if not self.spi:
+            raise RuntimeError('no SPI bus')
+        sd  = adafruit_sdcard.SDCard(self.spi, self._sdcs)
+        self._vfs = storage.VfsFat(sd)
+        storage.mount(self._vfs, "/sd")
+        if "/sd" not in sys.path:
+            sys.path.append("/sd")
+        return sd
+
+    def _init_Neopixel(self):
+        pixel = neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.2, pixel_order=neopixel.GRB)
+        pixel[0] = (0,0,0)
+        return pixel
+
+    def _init_ESP32(self):
         from adafruit_esp32spi import adafruit_esp32spi
-        # Initialize ESP32
+        if not self.spi:
+            raise RuntimeError('no SPI bus')
         try:
-            self._esp = adafruit_esp32spi.ESP_SPIcontrol(self._spi, self._esp_cs, self._esp_rdy, self._esp_rts, gpio0_pin=self._esp_dtr, debug=False)
-            if self._esp.status == adafruit_esp32spi.WL_IDLE_STATUS:
-                self.hardware['ESP32'] = True
+            esp = adafruit_esp32spi.ESP_SPIcontrol(self.spi, self._esp_cs, self._esp_rdy, self._esp_rts, gpio0_pin=self._esp_dtr, debug=False)
+            status = esp.status
         except Exception as e:
-            print('[WARNING]',e,'- have you programed the ESP32?')
+            raise RuntimeError(str(e) + ' - have you programed the ESP32?')
+        if status != adafruit_esp32spi.WL_IDLE_STATUS:
+            raise RuntimeError('ESP32 not idle after reset, status ' + str(status))
+        return esp
+
+    def _init_VBATT(self):
+        return analogio.AnalogIn(board.BATTERY)
+
+    @property
+    def spi(self):
+        return self._bring_up('SPI')
+
+    @property
+    def uart(self):
+        return self._bring_up('UART')
+
+    @property
+    def sd(self):
+        return self._bring_up('SDcard')
+
+    @property
+    def neopixel(self):
+        return self._bring_up('Neopixel')
+
+    @property
+    def esp(self):
+        return self._bring_up('ESP32')
+
+    @property
+    def vbatt(self):
+        return self._bring_up('VBATT')
+
+    def esp_init(self):
+        """Kept for older scripts, the ESP32 now comes up on first use of ``esp``."""
+        return self.esp
 
     @property
     def temperature_cpu(self):
@@ -93,10 +181,11 @@ class DevBoard:
 
     @property
     def RGB(self):
-        return self.neopixel[0]
+        if self.neopixel:
+            return self.neopixel[0]
     @RGB.setter
     def RGB(self,value):
-        if self.hardware['Neopixel']:
+        if self.neopixel:
             try:
                 self.neopixel[0] = value
             except Exception as e:
@@ -104,10 +193,11 @@ class DevBoard:
 
     @property
     def brightness(self):
-        return self.neopixel.brightness
+        if self.neopixel:
+            return self.neopixel.brightness
     @brightness.setter
     def brightness(self,value):
-        if self.hardware['Neopixel']:
+        if self.neopixel:
             try:
                 self.neopixel.brightness = value
             except Exception as e:
@@ -115,7 +205,7 @@ class DevBoard:
 
     def unique_file(self):
         import os
-        if not self.hardware['SDcard']:
+        if not self.sd:
             return False
         try:
             name = 'DATA_000'
@@ -198,29 +288,39 @@ class DevBoard:
             self.neopixel.auto_write = True
 
 
-    def battery_voltage(self):
-        _voltage = self._vbatt.value * 3.3 / (2 ** 16)
-        _voltage = _voltage / 2 # voltage divider
-        return _voltage # in volts
+    def battery_voltage(self, samples=16):
+        """Battery voltage averaged over ``samples`` ADC reads, in volts. ``None`` without
+        a battery pin."""
+        if not self.vbatt:
+            return None
+        return battery.read_voltage(self.vbatt, samples) # voltage divider halves it
+
+    @property
+    def battery(self):
+        """A ``battery.BatteryMonitor`` for charge, runtime and power policy."""
+        if self._battery is None and self.vbatt:
+            self._battery = battery.BatteryMonitor(self.vbatt)
+        return self._battery
 
 
 
     def esp_status(self):
-        if self.hardware['ESP32']:
+        if self.esp:
+            from adafruit_esp32spi import adafruit_esp32spi
             try:
-                if self._esp.status == adafruit_esp32spi.WL_IDLE_STATUS:
+                if self.esp.status == adafruit_esp32spi.WL_IDLE_STATUS:
                     print('\tESP32 is idle')
                 else:
-                    print('\t',self._esp.status)
+                    print('\t',self.esp.status)
             except Exception as e:
                 print('[WARNING]',e)
         else:
             print('[WARNING] ESP32 not initialized')
 
     def ap_scan(self):
-        if self.hardware['ESP32']:
+        if self.esp:
             try:
-                for ap in self._esp.scan_networks():
+                for ap in self.esp.scan_networks():
                     print("\t%s\tRSSI: %d" % (str(ap['ssid'], 'utf-8'), ap['rssi']))
             except Exception as e:
                 print('[WARNING]',e)
@@ -228,28 +328,28 @@ class DevBoard:
             print('[WARNING] ESP32 not initialized')
 
     def wifi(self,ssid,pswrd):
-        if self.hardware['ESP32']:
+        if self.esp:
             try:
                 print("\tConnecting to AP...")
-                while not self._esp.is_connected:
+                while not self.esp.is_connected:
                     try:
-                        self._esp.connect_AP(bytes(bytearray(ssid)),bytes(bytearray(pswrd)))
+                        self.esp.connect_AP(bytes(bytearray(ssid)),bytes(bytearray(pswrd)))
                     except RuntimeError as e:
                         print("\t\tCould not connect to AP, retrying: ",e)
                         continue
-                print("\tConnected to", str(self._esp.ssid, 'utf-8'), "\tRSSI:", self._esp.rssi)
-                print("\tMy IP address is", self._esp.pretty_ip(self._esp.ip_address))
-                print("\tPing google.com: %d ms" % self._esp.ping("google.com"))
+                print("\tConnected to", str(self.esp.ssid, 'utf-8'), "\tRSSI:", self.esp.rssi)
+                print("\tMy IP address is", self.esp.pretty_ip(self.esp.ip_address))
+                print("\tPing google.com: %d ms" % self.esp.ping("google.com"))
             except Exception as e:
                 print('[WARNING]',e)
         else:
             print('[WARNING] ESP32 not initialized')
 
     def esp_prog(self):
-        if self.hardware['SDcard']:
+        if self.sd:
             try:
                 import adafruit_miniesptool
-                esptool = adafruit_miniesptool.miniesptool(self._uart, self._esp_dtr, self._esp_rts, flashsize=4*1024*1024)
+                esptool = adafruit_miniesptool.miniesptool(self.uart, self._esp_dtr, self._esp_rts, flashsize=4*1024*1024)
                 esptool.debug = False #True
                 time.sleep(0.5)
 
@@ -272,12 +372,12 @@ class DevBoard:
             print('[WARNING] no SD card found')
 
     def esp_repl(self):
-        if self.hardware['ESP32']:
+        if self.esp:
             while True:
                 try:
-                    if self._uart.in_waiting:
+                    if self.uart.in_waiting:
                         try:
-                            data = self._uart.read()
+                            data = self.uart.read()
                             data_string = ''.join([chr(b) for b in data])
                             print('\t',data_string, end='')
                         except:
@@ -287,9 +387,9 @@ class DevBoard:
                         if call == 'exit':
                             print('=== exiting ESP32 REPL ===')
                             return
-                        self._uart.write(bytes(call, 'utf-8')+b'\x0d\x0a') #add CR+LF to end of call
+                        self.uart.write(bytes(call, 'utf-8')+b'\x0d\x0a') #add CR+LF to end of call
                         try:
-                            data = self._uart.read()
+                            data = self.uart.read()
                             data_string = ''.join([chr(b) for b in data])
                             print(data_string, end='')
                         except:
@@ -313,14 +413,14 @@ class DevBoard:
         from secrets import secrets
         from adafruit_io.adafruit_io import IO_MQTT
         from adafruit_minimqtt import MQTT
-        if not self.hardware['ESP32']:
-            raise
+        if not self.esp:
+            raise RuntimeError('ESP32 not initialized')
         if not action: action=self.message
         if not conn: conn=self.connected
         if not disc: disc=self.disconnected
         # try:
-        requests.set_socket(socket,self._esp)
-        self.WIFI = adafruit_esp32spi_wifimanager.ESPSPI_WiFiManager(self._esp, secrets, status_pixel=None)
+        requests.set_socket(socket,self.esp)
+        self.WIFI = adafruit_esp32spi_wifimanager.ESPSPI_WiFiManager(self.esp, secrets, status_pixel=None)
         self.group_name = group
 
         self.WIFI.connect()
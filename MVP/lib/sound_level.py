@@ -0,0 +1,138 @@
+"""
+`sound_level`
+================================================================================
+
+Microphone level meter for an analog electret microphone.
+
+Each ``update()`` captures a short burst of ADC samples at a fixed rate into a
+preallocated ``array('H')``, so it allocates nothing and blocks for
+``samples / rate`` seconds (4 ms with the defaults). The burst's DC offset is
+removed and its RMS and peak are worked out with integer math, on 12 bits
+since that's all the ADC resolves. Results are smoothed across bursts. The
+level is also given in dB relative to full scale, plus ``calibration`` to turn
+that into an estimate for a particular microphone.
+
+Typical use::
+
+    mic = SoundLevel(AnalogIn(board.A9))
+    while True:
+        mic.update()
+        print(mic.rms, mic.peak, mic.db)
+
+* Author(s): SmartMirror+ team
+"""
+
+import time
+from array import array
+
+FULL_SCALE = 2048  # half range of a 12 bit reading
+# 20 * log10(2) * log2(1 + i / 16), in tenths of a dB
+_LOG_FRACTION = (0, 5, 10, 15, 19, 24, 28, 32, 35, 39, 42, 45, 49, 52, 55, 57)
+_FULL_SCALE_DB = 662  # 20 * log10(FULL_SCALE), in tenths of a dB
+
+
+def isqrt(value):
+    """The integer square root of a non-negative int."""
+    if value < 2:
+        return value
+    root = value
+    guess = (root + 1) // 2
+    while guess < root:
+        root = guess
+        guess = (root + value // root) // 2
+    return root
+
+
+def decibels(value):
+    """``20 * log10(value)`` in tenths of a dB, to within a dB."""
+    if value < 1:
+        return None
+    exponent = 0
+    top = value
+    while top >= 32:
+        top >>= 1
+        exponent += 1
+    while top < 16:
+        top <<= 1
+        exponent -= 1
+    # top is now 16..31, i.e. 1 + fraction in 16ths, times 2 ** (exponent + 4)
+    return (exponent + 4) * 60 + (exponent + 4) // 5 + _LOG_FRACTION[top - 16]
+
+
+class SoundLevel:
+    """Burst-sampled RMS, peak and dB level of a microphone.
+
+    :param mic: The ``analogio.AnalogIn`` the microphone is on.
+    :param int samples: Samples per burst.
+    :param int rate: Samples per second within a burst.
+    :param int smoothing: Each burst moves the smoothed RMS ``1 / 2 ** smoothing`` of the way.
+    :param float calibration: Added to dB full scale to estimate the sound level.
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, mic, *, samples=32, rate=8000, smoothing=3, calibration=0):
+        self._mic = mic
+        self._buffer = array('H', [0] * samples)
+        self._period = 1000000000 // rate
+        self.smoothing = smoothing
+        self.calibration = calibration
+        self._rms = 0   # smoothed RMS, times 16
+        self._peak = 0
+        self.bursts = 0
+
+    @property
+    def rms(self):
+        """The smoothed RMS level, in 12 bit ADC counts."""
+        return self._rms >> 4
+
+    @property
+    def peak(self):
+        """The recent peak level, decaying between bursts, in 12 bit ADC counts."""
+        return self._peak
+
+    @property
+    def db(self):
+        """The smoothed level in dB full scale plus ``calibration``, ``None`` if silent."""
+        level = decibels(self._rms)
+        if level is None:
+            return None
+        return (level - _FULL_SCALE_DB - 241) / 10 + self.calibration  # 241: the times 16
+
+    def capture(self):
+        """Fill the sample buffer, one burst at the fixed rate."""
+        mic = self._mic
+        buffer = self._buffer
+        period = self._period
+        tick = time.monotonic_ns()
+        for i in range(len(buffer)):
+            while time.monotonic_ns() < tick:
+                pass
+            buffer[i] = mic.value
+            tick += period
+        return buffer
+
+    def update(self):
+        """Capture a burst and update the levels, returns the smoothed RMS."""
+        buffer = self.capture()
+        count = len(buffer)
+        total = 0
+        for sample in buffer:
+            total += sample >> 4
+        mean = total // count
+        squares = 0
+        peak = 0
+        for sample in buffer:
+            deviation = (sample >> 4) - mean
+            if deviation < 0:
+                deviation = -deviation
+            if deviation > peak:
+                peak = deviation
+            squares += deviation * deviation
+        rms = isqrt(squares // count)
+        if self.bursts:
+            self._rms += ((rms << 4) - self._rms) >> self.smoothing
+        else:
+            self._rms = rms << 4
+        self._peak = max(peak, self._peak - (self._peak >> 3))
+        self.bursts += 1
+        return self.rms
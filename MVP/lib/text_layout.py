@@ -0,0 +1,89 @@
+"""
+`text_layout`
+================================================================================
+
+Word wrapping shared by the PyPortal (BDF fonts) and RA8875 (built-in font)
+front-ends.
+
+Lines are measured against the real glyph widths of the font in use. Each word
+is measured once and each line is joined once, so wrapping is linear in the
+length of the text. Results are cached by (text, width, font), since the same
+strings are usually wrapped again on every refresh.
+
+* Author(s): SmartMirror+ team
+"""
+
+CACHE_SIZE = 32
+
+_cache = {}
+
+
+def wrap(text, width, measure=None, font_key=None):
+    """Break ``text`` into a list of lines no wider than ``width``.
+
+    A word wider than ``width`` gets a line of its own.
+
+    :param str text: The text to be wrapped. Newlines are treated as spaces.
+    :param width: The widest a line may be, in the units ``measure`` returns.
+    :param measure: A function returning the width of one character. Defaults to ``1`` per
+                    character, so ``width`` is a character count.
+    :param font_key: Identifies ``measure`` in the cache. Results aren't cached without it.
+
+    """
+    if font_key is not None:
+        key = (text, width, font_key)
+        lines = _cache.get(key)
+        if lines is not None:
+            return lines
+    if measure is None:
+        measure = len
+    text = text.replace('\r', '').replace('\n', ' ')
+    space = measure(' ')
+    lines = []
+    line = []
+    line_width = 0
+    for word in text.split(' '):
+        word_width = 0
+        for char in word:
+            word_width += measure(char)
+        if line and line_width + space + word_width > width:
+            lines.append(' '.join(line))
+            line = [word]
+            line_width = word_width
+        else:
+            if line:
+                line_width += space
+            line.append(word)
+            line_width += word_width
+    if line:
+        lines.append(' '.join(line))
+    if font_key is not None:
+        if len(_cache) >= CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = lines
+    return lines
+
+
+def wrap_chars(text, max_chars):
+    """Wrap to at most ``max_chars`` characters per line."""
+    return wrap(text, max_chars, None, "chars")
+
+
+def wrap_bdf(text, width, font):
+    """Wrap to ``width`` pixels in a ``bitmap_font`` font."""
+    widths = {}
+
+    def measure(char):
+        char_width = widths.get(char)
+        if char_width is None:
+            glyph = font.get_glyph(ord(char))
+            char_width = widths[char] = glyph.shift_x if glyph else 0
+        return char_width
+
+    return wrap(text, width, measure, id(font))
+
+
+def wrap_ra8875(text, width, txt_size=0):
+    """Wrap to ``width`` pixels in the RA8875 built-in 8x16 font at ``txt_size`` (0-3)."""
+    char_width = 8 * (txt_size + 1)
+    return wrap(text, width, lambda char: char_width, ("ra8875", txt_size))
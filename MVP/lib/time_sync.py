@@ -0,0 +1,106 @@
+"""
+`time_sync`
+================================================================================
+
+Adaptive internet time sync for ``PyPortal.get_local_time``.
+
+Each sync compares where the RTC thought it was with the time the server
+returned, and estimates the drift rate of the RTC from that. Once the drift is
+known, the interval between syncs is lengthened (doubling at most each time,
+up to ``max_interval``) so the expected error stays within ``max_error``
+seconds, which saves network wakeups on battery powered stations.
+
+Typical use::
+
+    clock = TimeSync(pyportal)
+    while True:
+        clock.update()
+        ...
+
+* Author(s): SmartMirror+ team
+"""
+
+import time
+
+
+class TimeSync:
+    """Schedules time syncs and tracks RTC drift.
+
+    :param pyportal: The ``PyPortal`` whose ``get_local_time()`` does the sync.
+    :param str location: Passed on to ``get_local_time()``.
+    :param int min_interval: Seconds between syncs until drift is known. Defaults to an hour.
+    :param int max_interval: The longest allowed gap between syncs. Defaults to a day.
+    :param float max_error: The clock error, in seconds, to sync before reaching.
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, pyportal, location=None, *, min_interval=3600, max_interval=86400,
+                 max_error=2):
+        self._pyportal = pyportal
+        self._location = location
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_error = max_error
+        self.interval = min_interval
+        self.drift = None       # seconds the RTC gains per second, negative if it loses
+        self.rtt = 0
+        self._samples = 0
+        self._last_sync = None  # time.monotonic() of the last sync
+        self._last_true = None  # server time of the last sync, in epoch seconds
+
+    @property
+    def due(self):
+        """Whether it is time to sync again."""
+        return (self._last_sync is None or
+                time.monotonic() - self._last_sync >= self.interval)
+
+    def update(self):
+        """Sync if due, returns ``True`` if a sync happened."""
+        if not self.due:
+            return False
+        self.sync()
+        return True
+
+    def sync(self):
+        """Set the clock from the internet now and update the drift estimate."""
+        rtc_before = time.time()
+        stamp = time.monotonic()
+        now = self._pyportal.get_local_time(self._location)
+        elapsed = time.monotonic() - stamp
+        true_now = time.mktime(now)
+        self.rtt = self._pyportal.time_rtt
+        if self._last_true is not None and true_now > self._last_true:
+            # epoch seconds don't fit a CircuitPython float to the second, so only the
+            # integer differences are taken before any float math
+            error = (rtc_before - true_now) + elapsed
+            rate = error / (true_now - self._last_true)
+            if self.drift is None:
+                self.drift = rate
+            else:
+                self.drift = (self.drift + rate) / 2
+            self._samples += 1
+        self._last_true = true_now
+        self._last_sync = time.monotonic()
+        self._adapt()
+        print("Time synced, drift %s, next sync in %d seconds" %
+              ("unknown" if self.drift is None else "%0.1f ppm" % (self.drift * 1000000),
+               self.interval))
+
+    def _adapt(self):
+        if self._samples < 2:
+            return  # one comparison is mostly RTC rounding, wait for another
+        if self.drift:
+            target = self.max_error / abs(self.drift)
+        else:
+            target = self.max_interval
+        self.interval = int(max(self.min_interval,
+                                min(self.max_interval, target, self.interval * 2)))
+
+    @property
+    def error(self):
+        """Estimated current clock error in seconds, ``None`` before the first sync."""
+        if self._last_sync is None:
+            return None
+        since = time.monotonic() - self._last_sync
+        # RTC only keeps whole seconds, so it's never better than half a second
+        return abs(self.drift or 0) * since + self.rtt / 2 + 0.5
@@ -20,6 +20,10 @@ import adafruit_esp32spi.adafruit_esp32spi_requests as requests
 import storage
 import adafruit_sdcard
 
+# Clock and sleep between updates
+from clock_widget import MinuteClock
+from power import PowerScheduler
+
 # Get WiFi info
 try:
     from secrets import secrets
@@ -100,17 +104,25 @@ print("MAC addr:", [hex(i) for i in esp.MAC_address])
 for ap in esp.scan_networks():
     print("\t%s\t\tRSSI: %d" % (str(ap['ssid'], 'utf-8'), ap['rssi']))
 
-print("Connecting to AP...")
+def connect_wifi():
+    print("Connecting to AP...")
+
+    while not esp.is_connected:
+        try:
+            esp.connect_AP(b'mayB', b'notlikely')
+        except RuntimeError as e:
+            print("could not connect to AP, retrying: ",e)
+            continue
 
-while not esp.is_connected:
-    try:
-        esp.connect_AP(b'mayB', b'notlikely')
-    except RuntimeError as e:
-        print("could not connect to AP, retrying: ",e)
-        continue
+    print("Connected to", str(esp.ssid, 'utf-8'), "\tRSSI:", esp.rssi)
+    print("My IP address is", esp.pretty_ip(esp.ip_address))
 
-print("Connected to", str(esp.ssid, 'utf-8'), "\tRSSI:", esp.rssi)
-print("My IP address is", esp.pretty_ip(esp.ip_address))
+def reconnect_wifi():
+    # the ESP32 was held in reset, so it starts over
+    esp.reset()
+    connect_wifi()
+
+connect_wifi()
 
 ####################################################################################################################################
 # Get images displayed on display
@@ -177,33 +189,29 @@ class BMP(object):
 ####################################################################################################################################
 # Get current local time and display on screen
 ####################################################################################################################################
-# Time source
+# Time source, synced every TIME_SYNC_INTERVAL seconds and kept on the monotonic clock in between
 TIME_URL = "http://worldtimeapi.org/api/timezone/" + secrets['timezone']
+TIME_SYNC_INTERVAL = 3600
 
-def get_time():
+clock = MinuteClock(am_pm=True)
+
+def sync_time():
     r = requests.get(TIME_URL)
     time = json.loads(r.text)
-    datetime = time['datetime']
-    times = datetime.split(":")
-    hour = int(times[0][-2:])
-    minute = int(times[1])
     r.close()
+    # e.g. "2020-03-12T14:23:45.123456-07:00"
+    times = time['datetime'].split("T")[1].split(":")
+    clock.set_time(int(times[0]), int(times[1]), int(times[2][:2]))
 
-    format_str = "%d:%02d"
-    if hour >= 12:
-        hour = hour - 12
-        format_str = format_str+" PM"
-    else:
-        format_str = format_str+" AM"
-    if hour == 0:
-        hour = 12
-    time_str = format_str % (hour, minute)
+def get_time():
+    if not clock.synced:
+        return
 
     # Time
     display.txt_set_cursor(530, 0)
     display.txt_trans(WHITE)
     display.txt_size(3)
-    display.txt_write(time_str)
+    display.txt_write(clock.text())
 
 ####################################################################################################################################
 # Display room environment info on screen
@@ -240,18 +248,27 @@ def room():
 ####################################################################################################################################
 # Display weather info on screen
 ####################################################################################################################################
-def weather():
-    # Location
-    LOCATION = "Palo Alto, US"
+# Location
+LOCATION = "Palo Alto, US"
 
-    # Grabbing weather data
-    DATA_SOURCE = "http://api.openweathermap.org/data/2.5/weather?q=" + LOCATION
-    DATA_SOURCE += "&appid=" + secrets['openweather_token']
-    DATA_LOCATION = []
+# Grabbing weather data
+DATA_SOURCE = "http://api.openweathermap.org/data/2.5/weather?q=" + LOCATION
+DATA_SOURCE += "&appid=" + secrets['openweather_token']
+DATA_LOCATION = []
+WEATHER_INTERVAL = 600
 
-    # Parse JSON file
+def fetch_weather():
+    # keep the reply, so the page can be redrawn without the radio
     r = requests.get(DATA_SOURCE)
-    weather = json.loads(r.text)
+    scheduler.state['weather'] = r.text
+    r.close()
+
+def weather():
+    if 'weather' not in scheduler.state:
+        return
+
+    # Parse JSON file
+    weather = json.loads(scheduler.state['weather'])
     city_name = weather['name']
     country = weather['sys']['country']
     weather_desc = weather['weather'][0]['icon']
@@ -267,7 +284,6 @@ def weather():
     max_temp = weather['main']['temp_max']
     cur_temp = weather['main']['temp']
     humidity = weather['main']['humidity']
-    r.close()
 
     # Open SD card
     fp = open("/sd/icons/" + weather_desc + ".bmp", 'r')
@@ -306,9 +322,27 @@ def weather():
 ####################################################################################################################################
 # Main loop:
 ####################################################################################################################################
+# Between updates the board light sleeps, with the ESP32 held in reset while no network
+# task is due, and wakes early on a press of the button
+PAGE_INTERVAL = 45
+WAKE_PINS = (board.D59,)
+
 display.txt_trans(WHITE)
 display_toggle = False
 
+def show_page():
+    display.init()
+    get_time()
+    weather()
+    display.init()
+    room()
+    get_time()
+
+scheduler = PowerScheduler(radio_reset=esp32_reset, reconnect=reconnect_wifi, wake_pins=WAKE_PINS)
+scheduler.add("time", TIME_SYNC_INTERVAL, sync_time, network=True)
+scheduler.add("weather", WEATHER_INTERVAL, fetch_weather, network=True)
+scheduler.add("page", PAGE_INTERVAL, show_page)
+
 while True:
     # Update switch state
     # switch.update()
@@ -320,10 +354,7 @@ while True:
 #     elif display_toggle:
 #     elif display_toggle:
 
-    get_time()
-    weather()
-    display.init()
-    room()
-    get_time()
-    time.sleep(45)
-    display.init()
\ No newline at end of file
+    scheduler.run_due()
+    if scheduler.sleep():
+        # woken by the button, show the page straight away
+        scheduler.trigger("page")
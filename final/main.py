@@ -4,10 +4,14 @@ import digitalio
 import board
 import json
 
-# Sensors
+# Fast boot
+from fast_boot import BootTimeline, LazyModule, BootTasks, FrameRecorder
+boot = BootTimeline()
+
+# Sensors (imported on first use)
 from busio import I2C
-import adafruit_bme680
-import adafruit_apds9960.apds9960
+adafruit_bme680 = LazyModule("adafruit_bme680", boot)
+apds9960 = LazyModule("adafruit_apds9960.apds9960", boot)
 
 # Button
 from adafruit_debouncer import Debouncer
@@ -16,14 +20,39 @@ from adafruit_debouncer import Debouncer
 import adafruit_ra8875.ra8875 as ra8875
 from adafruit_ra8875.ra8875 import color565
 
-# Wifi
-from adafruit_esp32spi import adafruit_esp32spi
-import adafruit_esp32spi.adafruit_esp32spi_requests as requests
+# Wifi (imported on first use)
+adafruit_esp32spi = LazyModule("adafruit_esp32spi.adafruit_esp32spi", boot)
+requests = LazyModule("adafruit_esp32spi.adafruit_esp32spi_requests", boot)
 
 # SD card storage
 import storage
 import adafruit_sdcard
 
+# Instrumentation
+from perf_stats import PERF
+
+# Text wrapping
+from text_layout import wrap_ra8875
+
+# QR code
+from qr_render import qr_runs, draw_ra8875
+
+# Clock
+from clock_widget import MinuteClock, RA8875Clock
+
+# Air quality
+from iaq import AirQuality, rating
+
+# Sound level
+from sound_level import SoundLevel
+
+# Battery
+from analogio import AnalogIn
+from battery import BatteryMonitor
+
+# Crash recovery
+from recovery import Recovery
+
 # Get WiFi info
 try:
     from secrets import secrets
@@ -36,6 +65,8 @@ try:
 except ImportError:
     import ustruct as struct
 
+boot.mark("imports")
+
 ####################################################################################################################################
 # Configuration of pins, esp32, etc.
 ####################################################################################################################################
@@ -61,73 +92,53 @@ button.direction = digitalio.Direction.INPUT
 button.pull = digitalio.Pull.UP
 switch = Debouncer(button)
 
+# Holding the button for LONG_PRESS seconds shows a QR code of PAIRING_URL until the next press
+LONG_PRESS = 2
+
 # Config for display baudrate (default max is 6mhz):
 BAUDRATE = 6000000
 
-# Setup SPI bus using hardware SPI:
-spi = busio.SPI(clock=board.SCK, MOSI=board.MOSI, MISO=board.MISO)
+# Last frame shown, repainted at boot before anything else comes up
+FRAME_FILE = "/sd/last_frame.json"
+FRAME_SAVE_INTERVAL = 60
+SPLASH_FILE = "/sd/splash.bmp"
 
-# Setup I2C bus for using hardware sensors
-i2c = I2C(board.SCL, board.SDA)
-bme680 = adafruit_bme680.Adafruit_BME680_I2C(i2c, debug=False)
-apds = adafruit_apds9960.apds9960.APDS9960(i2c)
-apds.enable_proximity = True
-apds.enable_gesture = False
-
-# Set location's pressure (hPa) at sea level
-bme680.sea_level_pressure = 1015.25
-
-# Create and setup the RA8875 display:
-# Display is 800 x 480
-display = ra8875.RA8875(spi, cs=cs_pin, rst=rst_pin, baudrate=BAUDRATE)
-display.init()
-
-# SAM32 board ESP32 Setup
-dtr = digitalio.DigitalInOut(board.DTR)
-esp32_cs = digitalio.DigitalInOut(board.TMS)
-esp32_ready = digitalio.DigitalInOut(board.TCK)
-esp32_reset = digitalio.DigitalInOut(board.RTS)
-esp = adafruit_esp32spi.ESP_SPIcontrol(spi, esp32_cs, esp32_ready, esp32_reset, gpio0_pin=dtr, debug=False)
-requests.set_interface(esp)
-
-# Touchscreen
-# display.touch_init(int_pin)
-# display.touch_enable(False)
-
-# Setup SD card
-cs = digitalio.DigitalInOut(board.xSDCS)
+# Repaint at most every REFRESH_INTERVAL seconds, stretched by the power policy on battery
+REFRESH_INTERVAL = 1
+BATTERY_POWERED = False
 
-# Connect to the card and mount the filesystem
-sdcard = adafruit_sdcard.SDCard(spi, cs)
-vfs = storage.VfsFat(sdcard)
-storage.mount(vfs, "/sd")
+# Gas resistance baseline for the air quality score, kept across reboots
+IAQ_FILE = "/sd/iaq_baseline.json"
 
-# Config for display baudrate (default max is 6mhz):
-BAUDRATE = 8000000
+# Microphone, sampled in a 4 ms burst every MIC_BURST_EVERY loops
+MIC_PIN = board.A9
+MIC_BURST_EVERY = 10
 
-####################################################################################################################################
-# Get WiFi connection
-####################################################################################################################################
-if esp.status == adafruit_esp32spi.WL_IDLE_STATUS:
-    print("ESP32 found and in idle mode")
+# State saved every FRAME_SAVE_INTERVAL seconds and before restarting, so a restart picks up where
+# it left off. The watchdog resets the board if the main loop hangs for WATCHDOG_TIMEOUT seconds,
+# and MAX_ERRORS failed loops in a row restart the program.
+STATE_FILE = "/sd/state.json"
+WATCHDOG_TIMEOUT = 16
+MAX_ERRORS = 5
 
-print("Firmware vers.", esp.firmware_version)
-print("MAC addr:", [hex(i) for i in esp.MAC_address])
+# Weather is fetched every WEATHER_INTERVAL seconds and redrawn from the last reply in between
+WEATHER_INTERVAL = 600
 
-for ap in esp.scan_networks():
-    print("\t%s\t\tRSSI: %d" % (str(ap['ssid'], 'utf-8'), ap['rssi']))
+# Print nearby access points while bringing up Wi-Fi
+WIFI_SCAN = False
 
-print("Connecting to AP...")
+# Scanned from the pairing page to set the mirror up from a phone
+PAIRING_URL = secrets.get('pairing_url', "https://github.com/nathgoh/SmartMirrorPlus")
 
-while not esp.is_connected:
-    try:
-        esp.connect_AP(b'mayB', b'notlikely')
-    except RuntimeError as e:
-        print("could not connect to AP, retrying: ",e)
-        continue
+# Hardware that failed to come up is tried again every BRING_UP_RETRY seconds
+BRING_UP_RETRY = 60
 
-print("Connected to", str(esp.ssid, 'utf-8'), "\tRSSI:", esp.rssi)
-print("My IP address is", esp.pretty_ip(esp.ip_address))
+# Per-stage timing: print a report every PERF_REPORT_EVERY loops, optionally draw it on screen
+# and push it to Adafruit IO feeds named "<PERF_IO_PREFIX>-<stage>"
+PERF.enabled = False
+PERF_REPORT_EVERY = 10
+PERF_OVERLAY = False
+PERF_IO_PREFIX = None
 
 ####################################################################################################################################
 # Get images displayed on display
@@ -168,12 +179,16 @@ class BMP(object):
             if line_size % 4 != 0:
                 line_size += (4 - line_size % 4)
             current_line_data = b''
+            read_time = 0
+            draw_time = 0
             with open(self.filename, 'rb') as f:
                 f.seek(self.data)
                 disp.set_window(x, y, self.width, self.height)
                 for line in range(self.height):
                     current_line_data = b''
+                    stamp = PERF.start()
                     line_data = f.read(line_size)
+                    read_time += PERF.since(stamp)
                     for i in range(0, line_size, self.bpp//8):
                         if (line_size-i) < self.bpp//8:
                             break
@@ -182,49 +197,181 @@ class BMP(object):
                         if self.bpp == 24 or self.bpp == 32:
                             color = color565(line_data[i+2], line_data[i+1], line_data[i])
                         current_line_data = current_line_data + struct.pack(">H", color)
+                    stamp = PERF.start()
                     disp.setxy(x, self.height - line + y)
                     disp.push_pixels(current_line_data)
+                    draw_time += PERF.since(stamp)
                 disp.set_window(0, 0, disp.width, disp.height)
+            PERF.add("sd", read_time)
+            PERF.add("draw", draw_time)
+
+def draw_bitmap(filename, x, y):
+    BMP(filename).draw(display, x, y)
+    display.note_bitmap(filename, x, y)
+
+####################################################################################################################################
+# Boot: display and SD card first, then repaint the last frame
+####################################################################################################################################
+
+# Setup SPI bus using hardware SPI:
+spi = busio.SPI(clock=board.SCK, MOSI=board.MOSI, MISO=board.MISO)
+
+# Create and setup the RA8875 display:
+# Display is 800 x 480
+display = FrameRecorder(ra8875.RA8875(spi, cs=cs_pin, rst=rst_pin, baudrate=BAUDRATE), FRAME_FILE)
+display.init()
+boot.mark("display")
+
+# Touchscreen
+# display.touch_init(int_pin)
+# display.touch_enable(False)
+
+# Setup SD card
+cs = digitalio.DigitalInOut(board.xSDCS)
+
+# Connect to the card and mount the filesystem
+try:
+    sdcard = adafruit_sdcard.SDCard(spi, cs)
+    vfs = storage.VfsFat(sdcard)
+    storage.mount(vfs, "/sd")
+except OSError as e:
+    print("No SD card found:", e)
+boot.mark("sd")
+
+air = AirQuality(IAQ_FILE)
+recovery = Recovery(STATE_FILE)
+state = recovery.load()
+
+frame_stale = display.replay(draw_bitmap)
+if not frame_stale:
+    try:
+        draw_bitmap(SPLASH_FILE, 0, 0)
+        frame_stale = True
+    except OSError:
+        pass # no splash either, start from a blank screen
+boot.mark("first paint")
+
+####################################################################################################################################
+# Background bring-up of sensors, ESP32 and WiFi, stepped from the main loop
+####################################################################################################################################
+i2c = None
+bme680 = None
+apds = None
+mic = None
+esp = None
+esp32_pins = ()
+
+def bring_up_sensors():
+    global i2c, bme680, apds, mic
+    if i2c:
+        i2c.deinit() # left over from a failed attempt
+    # Setup I2C bus for using hardware sensors
+    i2c = I2C(board.SCL, board.SDA)
+    bme680 = adafruit_bme680.Adafruit_BME680_I2C(i2c, debug=False)
+    # Set location's pressure (hPa) at sea level
+    bme680.sea_level_pressure = 1015.25
+    yield
+    apds = apds9960.APDS9960(i2c)
+    apds.enable_proximity = True
+    apds.enable_gesture = False
+    mic = SoundLevel(AnalogIn(MIC_PIN))
+
+def bring_up_esp32():
+    global esp, esp32_pins
+    for pin in esp32_pins:
+        pin.deinit() # left over from a failed attempt
+    # SAM32 board ESP32 Setup
+    dtr = digitalio.DigitalInOut(board.DTR)
+    esp32_cs = digitalio.DigitalInOut(board.TMS)
+    esp32_ready = digitalio.DigitalInOut(board.TCK)
+    esp32_reset = digitalio.DigitalInOut(board.RTS)
+    esp32_pins = (dtr, esp32_cs, esp32_ready, esp32_reset)
+    esp = adafruit_esp32spi.ESP_SPIcontrol(spi, esp32_cs, esp32_ready, esp32_reset, gpio0_pin=dtr, debug=False)
+    requests.set_interface(esp)
+    yield
+
+    if esp.status == adafruit_esp32spi.WL_IDLE_STATUS:
+        print("ESP32 found and in idle mode")
+
+    print("Firmware vers.", esp.firmware_version)
+    print("MAC addr:", [hex(i) for i in esp.MAC_address])
+
+    if WIFI_SCAN:
+        yield
+        for ap in esp.scan_networks():
+            print("\t%s\t\tRSSI: %d" % (str(ap['ssid'], 'utf-8'), ap['rssi']))
+
+def bring_up_wifi():
+    if not tasks.done("esp32"):
+        raise RuntimeError("no ESP32")
+    print("Connecting to AP...")
+
+    stamp = PERF.start()
+    while not esp.is_connected:
+        try:
+            esp.connect_AP(b'mayB', b'notlikely')
+        except RuntimeError as e:
+            print("could not connect to AP, retrying: ",e)
+            yield
+    PERF.stop("wifi", stamp)
+
+    print("Connected to", str(esp.ssid, 'utf-8'), "\tRSSI:", esp.rssi)
+    print("My IP address is", esp.pretty_ip(esp.ip_address))
+
+tasks = BootTasks(boot)
+tasks.add("sensors", bring_up_sensors)
+tasks.add("esp32", bring_up_esp32)
+tasks.add("wifi", bring_up_wifi)
 
 ####################################################################################################################################
 # Get current local time and display on screen
 ####################################################################################################################################
-# Time
+# Time, synced from the internet every TIME_SYNC_INTERVAL seconds and kept on the monotonic clock
+# in between
 TIME_URL = "http://worldtimeapi.org/api/timezone/" + secrets['timezone']
+TIME_SYNC_INTERVAL = 3600
+
+clock = MinuteClock(am_pm=True, sync_interval=TIME_SYNC_INTERVAL)
+clock_face = RA8875Clock(display, 530, 0, txt_size=3, color=WHITE, background=BLACK)
 
-def time():
+def sync_time():
+    stamp = PERF.start()
     r = requests.get(TIME_URL)
-    time = json.loads(r.text)
-    datetime = time['datetime']
-    times = datetime.split(":")
-    hour = int(times[0][-2:])
-    minute = int(times[1])
+    PERF.stop("http", stamp)
+    stamp = PERF.start()
+    now = json.loads(r.text)
+    PERF.stop("json", stamp)
     r.close()
-
-    format_str = "%d:%02d"
-    if hour >= 12:
-        hour = hour - 12
-        format_str = format_str+" PM"
-    else:
-        format_str = format_str+" AM"
-    if hour == 0:
-        hour = 12
-    time_str = format_str % (hour, minute)
-
-    # Time
-    display.txt_set_cursor(530, 0)
-    display.txt_trans(WHITE)
-    display.txt_size(3)
-    display.txt_write(time_str)
+    # e.g. "2020-03-12T14:23:45.123456-07:00"
+    times = now['datetime'].split("T")[1].split(":")
+    clock.set_time(int(times[0]), int(times[1]), int(times[2][:2]))
+
+def get_time():
+    if clock.sync_due and tasks.done("wifi"):
+        try:
+            sync_time()
+        except (RuntimeError, ValueError, KeyError) as e:
+            print("could not sync time: ", e)
+    if not clock.synced:
+        return  # the RTC was never set, show nothing rather than a wrong time
+
+    # Time, only the characters that changed since the last minute are redrawn
+    stamp = PERF.start()
+    clock_face.draw(clock.text())
+    PERF.stop("draw", stamp)
 
 ####################################################################################################################################
 # Display room environment info on screen
 ####################################################################################################################################
 def room():
     # Room environment data
+    stamp = PERF.start()
     bme_data = [bme680.temperature, bme680.gas, bme680.humidity, bme680.pressure, bme680.altitude]
+    PERF.stop("sensors", stamp)
+    air.update(bme_data[1], bme_data[2])
 
     # Title
+    stamp = PERF.start()
     display.txt_set_cursor(15, 0)
     display.txt_size(3)
     display.txt_write("Room")
@@ -243,28 +390,85 @@ def room():
 
     display.txt_set_cursor(0, 230)
     display.txt_size(2)
-    display.txt_write("Gas: {0}".format(round(bme_data[3], 2)) + " Ohms")
+    display.txt_write("Gas: {0}".format(round(bme_data[1])) + " Ohms")
 
     display.txt_set_cursor(0, 280)
     display.txt_size(2)
     display.txt_write("Altitude: {0}".format(round(bme_data[4], 2)) + "m")
 
+    display.txt_set_cursor(0, 330)
+    display.txt_size(2)
+    if air.ready:
+        display.txt_write("Air quality: {0}% ({1})".format(round(air.score), rating(air.score)))
+    else:
+        display.txt_write("Air quality: warming up")
+
+    display.txt_set_cursor(0, 380)
+    display.txt_size(2)
+    level = mic.db if mic else None
+    if level is None:
+        display.txt_write("Sound: quiet")
+    else:
+        display.txt_write("Sound: {0} dBFS".format(round(level, 1)))
+    PERF.stop("draw", stamp)
+
+def sensors_missing_page():
+    display.txt_set_cursor(15, 0)
+    display.txt_size(3)
+    display.txt_write("Room")
+
+    display.txt_set_cursor(0, 80)
+    display.txt_size(2)
+    display.txt_write("Sensors missing: {0}".format(tasks.failed["sensors"]))
+
 ####################################################################################################################################
 # Display weather info on screen
 ####################################################################################################################################
-def weather():
-    # Location
-    LOCATION = "Palo Alto, US"
+# Location
+LOCATION = "Palo Alto, US"
 
-    # Grabbing weather data
-    DATA_SOURCE = "http://api.openweathermap.org/data/2.5/weather?q=" + LOCATION
-    DATA_SOURCE += "&appid=" + secrets['openweather_token']
-    DATA_LOCATION = []
+# Grabbing weather data
+DATA_SOURCE = "http://api.openweathermap.org/data/2.5/weather?q=" + LOCATION
+DATA_SOURCE += "&appid=" + secrets['openweather_token']
+DATA_LOCATION = []
 
-    # Parse JSON file
+def valid_weather(weather):
+    # Whether a parsed reply has everything weather() draws
+    try:
+        return (isinstance(weather['name'], str) and isinstance(weather['sys']['country'], str) and
+                all(isinstance(weather['weather'][0][key], str) and weather['weather'][0][key]
+                    for key in ('icon', 'main', 'description')) and
+                all(isinstance(weather['main'][key], (int, float))
+                    for key in ('temp', 'temp_min', 'temp_max', 'humidity')))
+    except (KeyError, IndexError, TypeError):
+        return False
+
+# Last good reply, parsed
+last_weather = state.get('weather')
+if not valid_weather(last_weather):
+    last_weather = None
+weather_fetched = None
+
+def fetch_weather():
+    global last_weather, weather_fetched
+    stamp = PERF.start()
     r = requests.get(DATA_SOURCE)
-    print(r.json())
-    weather = json.loads(r.text)
+    PERF.stop("http", stamp)
+    text = r.text
+    r.close()
+    weather_fetched = time.monotonic()
+    stamp = PERF.start()
+    weather = json.loads(text)
+    PERF.stop("json", stamp)
+    if not valid_weather(weather):
+        # keep drawing the last good reply
+        print("Unexpected weather reply: ", text[:80])
+        return
+    last_weather = weather
+
+def weather():
+    weather = last_weather
+    print(weather)
     city_name = weather['name']
     country = weather['sys']['country']
     weather_desc = weather['weather'][0]['icon']
@@ -272,20 +476,18 @@ def weather():
     main = main[0].upper() + main[1:]
     weather_info = weather['weather'][0]['description']
     description_words = weather_info.split(" ")
-    weather_info = ""
-    for word in description_words:
-        word = word[0].upper() + word[1:]
-        weather_info += word + " "
+    weather_info = " ".join([word[0].upper() + word[1:] for word in description_words if word])
     min_temp = weather['main']['temp_min']
     max_temp = weather['main']['temp_max']
     cur_temp = weather['main']['temp']
     humidity = weather['main']['humidity']
-    r.close()
 
-    fp = open("/sd/icons/" + weather_desc + ".bmp", 'r')
+    stamp = PERF.start()
     weather_icon = BMP("/sd/icons/" + weather_desc + ".bmp")
+    PERF.stop("sd", stamp)
 
     # Location
+    stamp = PERF.start()
     display.txt_set_cursor(15, 0)
     display.txt_size(3)
     display.txt_write(city_name + ", " + country)
@@ -296,10 +498,14 @@ def weather():
     display.txt_size(3)
     display.txt_write(main)
 
-    # Weather description
-    display.txt_set_cursor(15, 430)
+    # Weather description, wrapped short of the temperature column (two lines at most)
+    lines = wrap_ra8875(weather_info, 590, 1)[:2]
+    line_y = 430 if len(lines) == 1 else 414
     display.txt_size(1)
-    display.txt_write(weather_info)
+    for line in lines:
+        display.txt_set_cursor(15, line_y)
+        display.txt_write(line)
+        line_y += 32
 
     # Current temp
     display.txt_set_cursor(610, 360)
@@ -311,26 +517,203 @@ def weather():
     display.txt_size(1)
     display.txt_write("{0}".format(round(((min_temp- 273 )* 9 / 5) + 32, 1))  + "°/" +
     "{0}".format(round(((max_temp - 273 )* 9 / 5) + 32, 1)) + "°")
+    PERF.stop("draw", stamp)
 
     # Icon
-    weather_icon.draw(display, (display.width - weather_icon.width)// 2, (display.height - weather_icon.height) // 2)
+    icon_x = (display.width - weather_icon.width) // 2
+    icon_y = (display.height - weather_icon.height) // 2
+    weather_icon.draw(display, icon_x, icon_y)
+    display.note_bitmap(weather_icon.filename, icon_x, icon_y)
+
+####################################################################################################################################
+# Display a pairing QR code on screen
+####################################################################################################################################
+def pairing():
+    display.init()
+    clock_face.invalidate()
+
+    display.txt_set_cursor(15, 0)
+    display.txt_trans(WHITE)
+    display.txt_size(3)
+    display.txt_write("Scan to pair")
+
+    # Each run of dark modules is one hardware rectangle fill. Drawn unrecorded, it is only up
+    # until the next press.
+    stamp = PERF.start()
+    size, _ = qr_runs(PAIRING_URL)
+    scale = (display.height - 80) // (size + 2)
+    qr_x = (display.width - (size + 2) * scale) // 2
+    draw_ra8875(display.raw, PAIRING_URL, qr_x, 72, scale, BLACK, WHITE)
+    PERF.stop("draw", stamp)
+
+####################################################################################################################################
+# Power policy: dim the display and stretch refresh and sync intervals as the battery drains
+####################################################################################################################################
+battery = BatteryMonitor(AnalogIn(board.BATTERY)) if BATTERY_POWERED else None
+refresh_interval = REFRESH_INTERVAL
+
+def apply_power_policy():
+    global refresh_interval
+    policy = battery.policy
+    display.brightness(int(255 * policy.brightness))
+    refresh_interval = REFRESH_INTERVAL * policy.refresh
+    clock.sync_interval = TIME_SYNC_INTERVAL * policy.sync
+    runtime = battery.runtime
+    if runtime:
+        print("Battery runtime left: %0.1f hours" % (runtime / 3600))
+
+####################################################################################################################################
+# State snapshot for crash recovery
+####################################################################################################################################
+def snapshot():
+    snap = {'page': display_toggle}
+    if last_weather:
+        snap['weather'] = last_weather
+    if clock.snapshot():
+        snap['clock'] = clock.snapshot()
+    if air.ready:
+        snap['gas_baseline'] = air.baseline
+    return snap
+
+def restart(reason):
+    print("Restarting:", reason)
+    recovery.save(snapshot(), force=True)
+    recovery.restart()
+
+# The clock runs on time.monotonic(), which only carries on across a reload
+if 'clock' in state and recovery.reloaded():
+    clock.restore(state['clock'])
+if 'gas_baseline' in state and not air.ready:
+    air.restore(state['gas_baseline'])
+
+####################################################################################################################################
+# Performance report
+####################################################################################################################################
+perf_io = None
+
+def perf_report():
+    global perf_io
+    PERF.report()
+    if PERF_OVERLAY:
+        PERF.draw_overlay(display, 560, 80, YELLOW)
+    if PERF_IO_PREFIX:
+        if not perf_io:
+            from adafruit_esp32spi import adafruit_esp32spi_wifimanager
+            from adafruit_io.adafruit_io import IO_HTTP
+            wifi = adafruit_esp32spi_wifimanager.ESPSPI_WiFiManager(esp, secrets, None)
+            perf_io = IO_HTTP(secrets['aio_username'], secrets['aio_key'], wifi)
+        try:
+            PERF.push_to_io(perf_io, PERF_IO_PREFIX)
+        except RuntimeError as e:
+            print("could not push perf stats: ", e)
 
 ####################################################################################################################################
 # Main loop:
 ####################################################################################################################################
-display.txt_trans(WHITE)
-display_toggle = False
+display_toggle = state.get('page', False)
+booting = True
+retried = None
+pressed = None
+showing_qr = False
+loops = 0
+frame_saved = time.monotonic()
+painted = None
+errors = 0
+recovery.start_watchdog(WATCHDOG_TIMEOUT)
 
 while True:
-    # Update switch state
-    switch.update()
-    if switch.fell:
-        display_toggle = not display_toggle
-        display.init()
-
-    if not display_toggle:
-        room()
-        time()
-    elif display_toggle:
-        time()
-        weather()
\ No newline at end of file
+    recovery.feed()
+    try:
+        # Keep bringing up hardware until everything is in
+        if booting:
+            booting = tasks.step()
+            if not booting:
+                if retried is None:
+                    boot.report()
+                retried = time.monotonic()
+        elif tasks.failed and time.monotonic() - retried >= BRING_UP_RETRY:
+            print("Retrying bring-up of", ", ".join(tasks.failed))
+            booting = tasks.retry()
+
+        # Update switch state
+        switch.update()
+        if switch.fell:
+            pressed = time.monotonic()
+            if showing_qr:
+                showing_qr = False # back to the page from before
+            else:
+                display_toggle = not display_toggle
+                recovery.save(snapshot(), force=True)
+            display.init()
+            clock_face.invalidate()
+            frame_stale = False
+        elif pressed is not None:
+            if switch.value:
+                pressed = None # released
+            elif time.monotonic() - pressed >= LONG_PRESS:
+                # a long press, undo the page change and show the QR code instead
+                pressed = None
+                display_toggle = not display_toggle
+                showing_qr = True
+                pairing()
+
+        if mic and loops % MIC_BURST_EVERY == 0:
+            mic.update()
+
+        if battery and battery.update():
+            apply_power_policy()
+
+        sensors_ready = tasks.done("sensors")
+        sensors_missing = "sensors" in tasks.failed
+        online = tasks.done("wifi")
+        restored = display_toggle and last_weather and clock.synced
+        room_known = sensors_ready or sensors_missing
+        if frame_stale and (online or (room_known and not display_toggle) or restored):
+            # first live data is in, clear the repainted frame
+            display.init()
+            clock_face.invalidate()
+            frame_stale = False
+
+        if not frame_stale and not showing_qr and (painted is None or time.monotonic() - painted >= refresh_interval):
+            painted = time.monotonic()
+            display.begin_frame()
+            display.txt_trans(WHITE)
+            if not display_toggle:
+                if sensors_ready:
+                    room()
+                elif sensors_missing:
+                    sensors_missing_page()
+                get_time()
+            else:
+                if online and (weather_fetched is None or
+                               time.monotonic() - weather_fetched > WEATHER_INTERVAL):
+                    fetch_weather()
+                get_time()
+                if last_weather:
+                    try:
+                        weather()
+                    except (KeyError, IndexError, TypeError, ValueError) as e:
+                        # a reply that can't be drawn won't get better, drop it and fetch again
+                        print("Dropping weather reply: ", e)
+                        last_weather = None
+                        weather_fetched = None
+
+            if time.monotonic() - frame_saved > FRAME_SAVE_INTERVAL:
+                display.save()
+                recovery.save(snapshot())
+                frame_saved = time.monotonic()
+
+        loops += 1
+        if PERF.enabled and loops % PERF_REPORT_EVERY == 0:
+            perf_report()
+
+        errors = 0
+    except MemoryError:
+        restart("out of memory")
+    except Exception as e: # pylint: disable=broad-except
+        # e.g. a failed request, a bad reply or a sensor that went away, carry on with what's on
+        # screen
+        errors += 1
+        print("Loop failed (%d in a row): %s" % (errors, e))
+        if errors >= MAX_ERRORS:
+            restart(e)
@@ -7,6 +7,7 @@ import sys
 import time
 import board
 from adafruit_pyportal import PyPortal
+from time_sync import TimeSync
 cwd = ("/"+__file__).rsplit('/', 1)[0] # the current working directory (where this file is)
 sys.path.append(cwd)
 import openweather_graphics  # pylint: disable=wrong-import-position
@@ -29,24 +30,32 @@ DATA_SOURCE += "&appid="+secrets['openweather_token']
 DATA_LOCATION = []
 
 
+# The last weather reply, saved if we run out of memory and have to restart
+last_value = None
+
 # Initialize the pyportal object and let us know what data to fetch and where
 # to display it
 pyportal = PyPortal(url=DATA_SOURCE,
                     json_path=DATA_LOCATION,
                     status_neopixel=board.NEOPIXEL,
-                    default_bg=0x000000)
+                    default_bg=0x000000,
+                    state_snapshot=lambda: {'weather': last_value})
 
 gfx = openweather_graphics.OpenWeather_Graphics(pyportal.splash, am_pm=True, celsius=False)
 
-localtile_refresh = None
+# show what we had before a restart straight away, fresh data follows
+last_value = pyportal.restored_state.get('weather')
+if last_value:
+    gfx.display_weather(last_value)
+
+# query the online time hourly at first, then less often as the clock drift becomes known
+clock = TimeSync(pyportal)
 weather_refresh = None
 while True:
-    # only query the online time once per hour (and on first run)
-    if (not localtile_refresh) or (time.monotonic() - localtile_refresh) > 3600:
+    if clock.due:
         try:
             print("Getting time from internet!")
-            pyportal.get_local_time()
-            localtile_refresh = time.monotonic()
+            clock.sync()
         except RuntimeError as e:
             print("Some error occured, retrying! -", e)
             continue
@@ -57,10 +66,11 @@ while True:
             value = pyportal.fetch()
             print("Response is", value)
             gfx.display_weather(value)
+            last_value = value
             weather_refresh = time.monotonic()
         except RuntimeError as e:
             print("Some error occured, retrying! -", e)
             continue
 
     gfx.update_time()
-    time.sleep(30)  # wait 30 seconds before updating anything again
\ No newline at end of file
+    time.sleep(gfx.clock.seconds_to_next_minute())  # wait for the clock to change
\ No newline at end of file
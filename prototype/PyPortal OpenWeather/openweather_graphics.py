@@ -1,9 +1,9 @@
-import time
 import json
-import board
 import displayio
 from adafruit_display_text.label import Label
-from adafruit_bitmap_font import bitmap_font
+import font_cache
+from icon_pool import IconPool
+from clock_widget import MinuteClock
 
 cwd = ("/"+__file__).rsplit('/', 1)[0] # the current working directory (where this file is)
 
@@ -15,6 +15,8 @@ class OpenWeather_Graphics(displayio.Group):
     def __init__(self, root_group, *, am_pm=True, celsius=True):
         super().__init__(max_size=2)
         self.am_pm = am_pm
+        self.clock = MinuteClock(am_pm=am_pm)
+        self._time_str = None
         self.celsius = celsius
 
         root_group.append(self)
@@ -23,19 +25,18 @@ class OpenWeather_Graphics(displayio.Group):
         self._text_group = displayio.Group(max_size=5)
         self.append(self._text_group)
 
-        self._icon_sprite = None
-        self._icon_file = None
+        self._icons = IconPool(self._icon_group)
         self.set_icon(cwd+"/weather_background.bmp")
 
-        self.small_font = bitmap_font.load_font(small_font)
-        self.medium_font = bitmap_font.load_font(medium_font)
-        self.large_font = bitmap_font.load_font(large_font)
         glyphs = b'0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-,.: '
-        self.small_font.load_glyphs(glyphs)
-        self.medium_font.load_glyphs(glyphs)
-        self.large_font.load_glyphs(glyphs)
-        self.large_font.load_glyphs(('°',))  # a non-ascii character we need for sure
+        self.small_font = font_cache.load_font(small_font, glyphs)
+        self.medium_font = font_cache.load_font(medium_font, glyphs)
+        self.large_font = font_cache.load_font(large_font, glyphs)
+        font_cache.load_font(large_font, '°')  # a non-ascii character we need for sure
         self.city_text = None
+        self._last_weather = None
+        self._last_record = None
+        self.skipped_repaints = 0
 
         self.time_text = Label(self.medium_font, max_glyphs=8)
         self.time_text.x = 200
@@ -62,57 +63,78 @@ class OpenWeather_Graphics(displayio.Group):
         self._text_group.append(self.description_text)
 
     def display_weather(self, weather):
+        """Show a weather reply from OpenWeather. Only the labels and icon whose values
+        changed since the last reply are touched; if none did, the repaint is skipped
+        and counted in ``skipped_repaints``.
+
+        :param str weather: The JSON reply text.
+
+        """
+        if weather == self._last_weather:
+            self.skipped_repaints += 1
+            print("Weather unchanged")
+            return
+        self._last_weather = weather
         weather = json.loads(weather)
 
-        # set the icon/background
         weather_icon = weather['weather'][0]['icon']
-        self.set_icon(cwd+"/icons/"+weather_icon+".bmp")
-
         city_name =  weather['name'] + ", " + weather['sys']['country']
-        print(city_name)
-        if not self.city_text:
-            self.city_text = Label(self.medium_font, text=city_name)
-            self.city_text.x = 10
-            self.city_text.y = 12
-            self.city_text.color = 0xFFFFFF
-            self._text_group.append(self.city_text)
-
-        self.update_time()
-
         main_text = weather['weather'][0]['main']
-        print(main_text)
-        self.main_text.text = main_text
-
         temperature = weather['main']['temp'] - 273.15 # its...in kelvin
-        print(temperature)
         if self.celsius:
-            self.temp_text.text = "%d °C" % temperature
+            temp_text = "%d °C" % temperature
         else:
-            self.temp_text.text = "%d °F" % ((temperature * 9 / 5) + 32)
-
+            temp_text = "%d °F" % ((temperature * 9 / 5) + 32)
         description = weather['weather'][0]['description']
         description = description[0].upper() + description[1:]
-        print(description)
-        self.description_text.text = description
         # "thunderstorm with heavy drizzle"
+        record = (weather_icon, city_name, main_text, temp_text, description)
+        last = self._last_record
+        self._last_record = record
+
+        self.update_time()
+
+        if record == last:
+            self.skipped_repaints += 1
+            print("Weather unchanged")
+            return
+        if not last:
+            last = (None,) * len(record)
+
+        # set the icon/background
+        if weather_icon != last[0]:
+            self.set_icon(cwd+"/icons/"+weather_icon+".bmp")
+
+        if city_name != last[1]:
+            print(city_name)
+            if not self.city_text:
+                self.city_text = Label(self.medium_font, max_glyphs=40)
+                self.city_text.x = 10
+                self.city_text.y = 12
+                self.city_text.color = 0xFFFFFF
+                self._text_group.append(self.city_text)
+            self.city_text.text = city_name
+
+        if main_text != last[2]:
+            print(main_text)
+            self.main_text.text = main_text
+
+        if temp_text != last[3]:
+            print(temp_text)
+            self.temp_text.text = temp_text
+
+        if description != last[4]:
+            print(description)
+            self.description_text.text = description
 
     def update_time(self):
-        """Fetch the time.localtime(), parse it out and update the display text"""
-        now = time.localtime()
-        hour = now[3]
-        minute = now[4]
-        format_str = "%d:%02d"
-        if self.am_pm:
-            if hour >= 12:
-                hour -= 12
-                format_str = format_str+" PM"
-            else:
-                format_str = format_str+" AM"
-            if hour == 0:
-                hour = 12
-        time_str = format_str % (hour, minute)
+        """Update the display text from time.localtime(), if the minute has changed"""
+        time_str = self.clock.text()
+        if time_str == self._time_str:
+            return
         print(time_str)
         self.time_text.text = time_str
+        self._time_str = time_str
 
     def set_icon(self, filename):
         """The background image to a bitmap file.
@@ -121,22 +143,5 @@ class OpenWeather_Graphics(displayio.Group):
 
         """
         print("Set icon to ", filename)
-        if self._icon_group:
-            self._icon_group.pop()
-
-        if not filename:
-            return  # we're done, no icon desired
-        if self._icon_file:
-            self._icon_file.close()
-        self._icon_file = open(filename, "rb")
-        icon = displayio.OnDiskBitmap(self._icon_file)
-        try:
-            self._icon_sprite = displayio.TileGrid(icon,
-                                                   pixel_shader=displayio.ColorConverter())
-        except TypeError:
-            self._icon_sprite = displayio.TileGrid(icon,
-                                                   pixel_shader=displayio.ColorConverter(),
-                                                   position=(0,0))
-        self._icon_group.append(self._icon_sprite)
-        board.DISPLAY.refresh_soon()
-        board.DISPLAY.wait_for_frame()
\ No newline at end of file
+        self._icons.show(filename)
+        self._icons.preload(IconPool.variant(filename))
\ No newline at end of file
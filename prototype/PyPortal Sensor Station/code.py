@@ -11,6 +11,7 @@ from adafruit_esp32spi import adafruit_esp32spi, adafruit_esp32spi_wifimanager
 from adafruit_io.adafruit_io import IO_HTTP, AdafruitIO_RequestError
 
 import sensor_station_helper
+from adaptive_sampler import AdaptiveSampler
 
 # Create library object using Bus I2C port
 i2c = busio.I2C(board.SCL, board.SDA)
@@ -28,7 +29,19 @@ bme680.sea_level_pressure = 1013.25
 # apds9960.enable_color = False
 # apds9960.enable_gesture = True
 
+# Sample every PYPORTAL_REFRESH seconds while readings change, backing off to
+# PYPORTAL_MAX_REFRESH while they're stable, and upload everything at least
+# every PYPORTAL_HEARTBEAT seconds
 PYPORTAL_REFRESH = 5
+PYPORTAL_MAX_REFRESH = 320
+PYPORTAL_HEARTBEAT = 900
+
+# Smallest change worth uploading, per quantity
+DEADBANDS = {'temperature': 0.2,   # C
+             'gas': 2000,          # ohm
+             'humidity': 1,        # %
+             'pressure': 0.5,      # hPa
+             'altitude': 5}        # m
 
 # Get wifi details and more from a secrets.py file
 try:
@@ -68,16 +81,18 @@ gas_feed = feed_list[1]
 humidity_feed = feed_list[2]
 pressure_feed = feed_list[3]
 temperature_feed = feed_list[4]
+feeds = {'temperature': temperature_feed, 'gas': gas_feed, 'humidity': humidity_feed,
+         'pressure': pressure_feed, 'altitude': altitude_feed}
 
 gfx = sensor_station_helper.SensorStation_GFX()
 
-def send_to_io():
-    # handle sending sensor data to Adafruit IO
-    io.send_data(temperature_feed['key'], bme680_data[0])
-    io.send_data(gas_feed['key'], bme680_data[1])
-    io.send_data(humidity_feed['key'], bme680_data[2])
-    io.send_data(pressure_feed['key'], bme680_data[3])
-    io.send_data(altitude_feed['key'], bme680_data[4])
+sampler = AdaptiveSampler(DEADBANDS, min_interval=PYPORTAL_REFRESH,
+                          max_interval=PYPORTAL_MAX_REFRESH, heartbeat=PYPORTAL_HEARTBEAT)
+
+def send_to_io(names):
+    # handle sending the changed sensor data to Adafruit IO
+    for name in names:
+        io.send_data(feeds[name]['key'], readings[name])
 
 while True:
 
@@ -91,13 +106,20 @@ while True:
     gfx.display_data(bme680_data)
     print('sensor data displayed!')
 
+    readings = {'temperature': bme680_data[0], 'gas': bme680_data[1], 'humidity': bme680_data[2],
+                'pressure': bme680_data[3], 'altitude': bme680_data[4]}
+    changed = sampler.changes(readings)
     try:
         try:
-            print('Sending data to Adafruit IO...')
-            gfx.display_io_status('Sending data to IO...')
-            send_to_io()
-            gfx.display_io_status('Data Sent!')
-            print('Data sent!')
+            if changed:
+                print('Sending data to Adafruit IO...', changed)
+                gfx.display_io_status('Sending data to IO...')
+                send_to_io(changed)
+                sampler.sent(readings, changed)
+                gfx.display_io_status('Data Sent!')
+                print('Data sent!')
+            else:
+                gfx.display_io_status('No change')
         except AdafruitIO_RequestError as e:
             raise AdafruitIO_RequestError('IO Error: ', e)
     except (ValueError, RuntimeError) as e:
@@ -105,4 +127,5 @@ while True:
         wifi.reset()
         continue
 
-    time.sleep(PYPORTAL_REFRESH)
\ No newline at end of file
+    print('next sample in', sampler.interval, 'seconds')
+    time.sleep(sampler.seconds_to_next())
\ No newline at end of file
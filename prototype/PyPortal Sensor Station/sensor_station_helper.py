@@ -5,7 +5,8 @@ Helper file for pyportal sensor station
 import board
 import displayio
 from adafruit_display_text.label import Label
-from adafruit_bitmap_font import bitmap_font
+import font_cache
+from icon_pool import IconPool
 
 cwd = ("/"+__file__).rsplit('/', 1)[0] # the current working directory (where this file is)
 
@@ -32,16 +33,14 @@ class SensorStation_GFX(displayio.Group):
         self._text_group = displayio.Group(max_size=8)
         self.append(self._text_group)
 
-        self._icon_sprite = None
-        self._icon_file = None
+        self._icons = IconPool(self._icon_group)
         self._cwd = cwd
         self.set_icon(self._cwd+"/icons/pyportal_splash.bmp")
 
         print('loading fonts...')
-        self.medium_font = bitmap_font.load_font(medium_font)
-        self.c_font = bitmap_font.load_font(header_font)
-        self.medium_font.load_glyphs(glyphs)
-        self.c_font.load_glyphs(glyphs)
+        # both are the same file, so font_cache only loads it once
+        self.medium_font = font_cache.load_font(medium_font, glyphs)
+        self.c_font = font_cache.load_font(header_font, glyphs)
 
         print('setting up Labels...')
         self.title_text = Label(self.c_font, text = "PyPortal Sensor Station")
@@ -114,23 +113,5 @@ class SensorStation_GFX(displayio.Group):
         :param filename: The filename of the chosen icon
         """
         print("Set icon to ", filename)
-        if self._icon_group:
-            self._icon_group.pop()
-
-        if not filename:
-            return  # we're done, no icon desired
-        if self._icon_file:
-            self._icon_file.close()
-        self._icon_file = open(filename, "rb")
-        icon = displayio.OnDiskBitmap(self._icon_file)
-        try:
-            self._icon_sprite = displayio.TileGrid(icon,
-                                                   pixel_shader=displayio.ColorConverter())
-        except TypeError:
-            self._icon_sprite = displayio.TileGrid(icon,
-                                                   pixel_shader=displayio.ColorConverter(),
-                                                   position=(0,0))
-
-        self._icon_group.append(self._icon_sprite)
-        board.DISPLAY.refresh_soon()
-        board.DISPLAY.wait_for_frame()
\ No newline at end of file
+        self._icons.show(filename)
+        self._icons.preload(IconPool.variant(filename))
\ No newline at end of file
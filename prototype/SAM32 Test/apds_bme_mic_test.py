@@ -7,6 +7,7 @@ from analogio import AnalogIn
 import board
 import busio
 import adafruit_apds9960.apds9960
+from sound_level import SoundLevel
 
 
 # Create library object using Bus I2C port
@@ -16,6 +17,7 @@ i2c = I2C(board.SCL, board.SDA)
 bme680 = adafruit_bme680.Adafruit_BME680_I2C(i2c, debug=False)
 apds9960 = adafruit_apds9960.apds9960.APDS9960(i2c)
 mic_pin = AnalogIn(board.A9)
+mic = SoundLevel(mic_pin)
 
 # Set location's pressure (hPa) at sea level
 bme680.sea_level_pressure = 1013.25
@@ -28,14 +30,12 @@ apds9960.enable_gesture = True
 
 while True:
 
-    n = (mic_pin.value / 65536) * 1000
-
     print("\nTemperature: %0.1f C" % bme680.temperature)
     print("Gas: %d ohm" % bme680.gas)
     print("Humidity: %0.1f %%" % bme680.humidity)
     print("Pressure: %0.3f hPa" % bme680.pressure)
     print("Altitude = %0.2f meters" % bme680.altitude)
-    print((n,))
+    print("Sound: rms %d, peak %d, %s dBFS" % (mic.rms, mic.peak, mic.db))
 
     print()
     print(apds9960.proximity())
@@ -52,4 +52,7 @@ while True:
     #elif gesture == 4:
     #    print("RIGHT")
 
-    time.sleep(1)
+    # measure sound in short bursts for the rest of the second
+    for _ in range(10):
+        mic.update()
+        time.sleep(0.1)